@@ -1,6 +1,8 @@
 import streamlit as st
 import warnings
 import os
+import io
+import re
 
 # --- 0. CONFIGURAZIONE AMBIENTE ---
 warnings.filterwarnings("ignore")
@@ -8,41 +10,123 @@ os.environ["GRPC_VERBOSITY"] = "ERROR"
 os.environ["GLOG_minloglevel"] = "2"
 
 from streamlit_option_menu import option_menu
-from streamlit_ace import st_ace
 import pandas as pd
 from modules import auth
+from modules import db
+from modules.query_cache import DatasetCache, fingerprint_bytes, workspace_fingerprint
+from modules import ingest
+from modules import columnar_cache
+from modules.lessons import LessonCatalog
+from modules.xp_queue import XPWriter
+from modules.leaderboard import Leaderboard, TRACK_COLUMNS, user_key
+from modules.sandbox import PythonPool
+from modules import sql_exec
+from modules import engines
+from modules import metrics
+from modules import grading
+from modules import index_advisor
+from modules import profiler
+from modules.memory import MemoryAccountant, resolve
 import time
+import uuid
+import threading
+from functools import wraps
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from urllib.parse import quote, unquote
 from dotenv import load_dotenv
-from supabase import create_client
 import sys
-from io import StringIO
-import contextlib
-import sqlite3
-import plotly.express as px
 
 # --- 1. SETUP ---
 st.set_page_config(page_title="DataGym", page_icon="⚡", layout="wide")
 load_dotenv()
 
 @st.cache_resource
-def init_supabase():
-    url = os.getenv("SUPABASE_URL")
-    key = os.getenv("SUPABASE_KEY")
-    return create_client(url, key) if url and key else None
+def init_metrics_server():
+    try: return metrics.start_server()
+    except OSError: return None  # porta già occupata: le metriche restano nel pannello debug
 
-supabase = init_supabase()
+init_metrics_server()
+
+@st.cache_resource
+def init_query_cache():
+    return DatasetCache()
+
+query_cache = init_query_cache()
+
+@st.cache_resource
+def init_sql_engines():
+    return engines.available_engines(query_cache)
+
+sql_engines = init_sql_engines()
+
+@st.cache_resource
+def init_reference_cache():
+    return grading.ReferenceCache()
+
+reference_cache = init_reference_cache()
+
+@st.cache_resource
+def init_memory_accountant():
+    return MemoryAccountant()
+
+memory_accountant = init_memory_accountant()
+
+@st.cache_resource
+def init_lesson_catalog():
+    catalog = LessonCatalog(db.get_client)
+    catalog.prefetch()
+    return catalog
+
+lesson_catalog = init_lesson_catalog()
+
+@st.cache_resource
+def init_leaderboard():
+    board = Leaderboard(db.get_client)
+    board.start()  # colonne rilevate in background, mai durante un RUN
+    return board
+
+leaderboard = init_leaderboard()
+
+@st.cache_resource
+def init_xp_writer():
+    # Ogni salvataggio riuscito aggiorna anche la classifica in memoria
+    return XPWriter(db.get_client, on_write=leaderboard.record)
+
+xp_writer = init_xp_writer()
+
+@st.cache_resource
+def init_run_executor():
+    return ThreadPoolExecutor(max_workers=int(os.getenv("DATAGYM_RUN_THREADS", "8")), thread_name_prefix="datagym-run")
+
+@st.cache_resource
+def init_python_pool():
+    return PythonPool()
 
 # Session State
 if 'page' not in st.session_state: st.session_state['page'] = 'Home'
+if 'session_id' not in st.session_state: st.session_state['session_id'] = uuid.uuid4().hex[:8]
 if 'user' not in st.session_state: st.session_state['user'] = None
+if 'auth_client' not in st.session_state: st.session_state['auth_client'] = None  # client Supabase della sessione (token dell'utente)
+if 'auth_checked' not in st.session_state: st.session_state['auth_checked'] = False  # cookie di sessione già letto
 if 'username' not in st.session_state: st.session_state['username'] = "Ospite"
 if 'track' not in st.session_state: st.session_state['track'] = 'SQL'
 if 'difficulty' not in st.session_state: st.session_state['difficulty'] = 'Principiante'
-if 'custom_df' not in st.session_state: st.session_state['custom_df'] = None 
+if 'workspace' not in st.session_state: st.session_state['workspace'] = {}  # tabella -> fingerprint, source, preview, file, upload
+if 'workspace_indexes' not in st.session_state: st.session_state['workspace_indexes'] = []
 if 'custom_table_name' not in st.session_state: st.session_state['custom_table_name'] = None
-if 'last_uploaded_file' not in st.session_state: st.session_state['last_uploaded_file'] = None 
+if 'imported_uploads' not in st.session_state: st.session_state['imported_uploads'] = set()  # file_id degli upload già importati
+if 'uploader_key' not in st.session_state: st.session_state['uploader_key'] = 0
+if 'custom_fingerprint' not in st.session_state: st.session_state['custom_fingerprint'] = None
+if 'sql_row_cap' not in st.session_state: st.session_state['sql_row_cap'] = sql_exec.ROW_CAP
+if 'lesson' not in st.session_state: st.session_state['lesson'] = None
+if 'profiles' not in st.session_state: st.session_state['profiles'] = []  # cronologia dei profili (⏱️ Profila)
+if 'sql_engine' not in st.session_state: st.session_state['sql_engine'] = engines.DEFAULT_ENGINE if engines.DEFAULT_ENGINE in sql_engines else 'sqlite'
 if 'xp' not in st.session_state: st.session_state['xp'] = 0
 if 'completed_tasks' not in st.session_state: st.session_state['completed_tasks'] = 0
+for _col in TRACK_COLUMNS.values():
+    if _col not in st.session_state: st.session_state[_col] = 0
+
+metrics.begin_rerun(page=st.session_state['page'], track=st.session_state['track'])
 
 # --- 2. CSS BLINDATO (FORCE DARK EVERYWHERE) ---
 st.markdown("""
@@ -137,40 +221,491 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- 3. FUNZIONI ---
+def rerun():
+    # st.rerun() interrompe lo script con un'eccezione: il rerun si chiude qui, altrimenti non verrebbe registrato
+    metrics.end_rerun()
+    st.rerun()
+
+def debug_timing():
+    # Pannello dei tempi: opt-in per deployment o per singola visita
+    return metrics.DEBUG_PANEL or st.query_params.get("debug") == "1"
+
+def timing_table(spans):
+    st.dataframe(pd.DataFrame([{"fase": n, "ms": round(sec * 1000, 1)} for n, sec, _ in spans]), hide_index=True, use_container_width=True)
+
+def measured_fragment(fn):
+    """st.fragment che misura anche i propri rerun.
+
+    Un fragment rieseguito da solo gira su un thread nuovo, senza il begin_rerun
+    dello script: qui si apre un rerun con pagina, traccia e nome del fragment.
+    Dentro un rerun completo (o in un fragment esterno) gli span vanno a quello.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if metrics.in_rerun(): return fn(*args, **kwargs)
+        metrics.begin_rerun(page=st.session_state['page'], track=st.session_state['track'], fragment=fn.__name__)
+        try: fn(*args, **kwargs)
+        finally: st.session_state['fragment_spans'] = metrics.end_rerun()
+        if debug_timing():
+            with st.expander(f"🐞 Tempi del fragment ({fn.__name__})"): timing_table(st.session_state['fragment_spans'])
+    return st.fragment(wrapper)
+
+@metrics.timed("get_lessons_from_db")
 def get_lessons_from_db(track, difficulty):
-    if not supabase: return {}
-    try:
-        response = supabase.table("lezioni").select("*").eq("track", track).eq("livello", difficulty).order("codice_lezione").execute()
-        return {f"{r['codice_lezione']} - {r['titolo']}": r for r in response.data}
-    except: return {}
+    # Servito dalla memoria: il catalogo completo si ricarica in blocco allo scadere del TTL
+    return lesson_catalog.get(track, difficulty)
 
-def execute_python_code(code):
-    output_capture = StringIO()
+def execute_python_code(code, cancel=None, stats=None):
+    # Eseguito in un processo worker isolato (timeout, limite memoria e output)
+    return init_python_pool().run(code, cancel=cancel, stats=stats)
+
+def run_query_on_csv(query, tables, fingerprint=None, row_cap=sql_exec.ROW_CAP, cancel=None, engine='sqlite', setup=(), stats=None):
     try:
-        with contextlib.redirect_stdout(output_capture):
-            exec(code, {}, {})
-        return output_capture.getvalue(), None
+        # tables è {nome: DataFrame, SessionDataset o path dello store su disco (import a blocchi)};
+        # con SQLite il workspace viene caricato una volta sola (cache condivisa)
+        if fingerprint is None:
+            fingerprint = workspace_fingerprint({tn: src if isinstance(src, str) else fingerprint_bytes(pd.util.hash_pandas_object(resolve(src)).values.tobytes()) for tn, src in tables.items()})
+        return sql_engines[engine].run(query, tables, fingerprint, row_cap=row_cap, cancel=cancel, setup=setup, stats=stats), None
     except Exception as e: return None, str(e)
 
-def run_query_on_csv(query, df, table_name):
+def drop_workspace_db(fp):
+    query_cache.invalidate(fp); reference_cache.invalidate(fp)
+    if 'duckdb' in sql_engines: sql_engines['duckdb'].invalidate(fp)
+
+def _workspace_changed(old_fp):
+    # Il database del workspace precedente non serve più: si ricarica con le nuove tabelle
+    drop_workspace_db(old_fp)
+    ws = st.session_state['workspace']
+    st.session_state['custom_fingerprint'] = workspace_fingerprint({tn: t['fingerprint'] for tn, t in ws.items()})
+
+def add_table(tn, entry):
+    old_fp = st.session_state['custom_fingerprint']
+    st.session_state['workspace'][tn] = entry
+    # Stesso nome: la tabella è sostituita e i suoi indici non valgono più
+    st.session_state['workspace_indexes'] = [s for s in st.session_state['workspace_indexes'] if s.table != tn]
+    st.session_state['custom_table_name'] = tn
+    _workspace_changed(old_fp)
+
+def remove_table(tn):
+    # L'upload resta tra gli importati: è ancora nell'uploader e non va reimportato;
+    # caricando di nuovo il file (nuovo file_id) la tabella torna
+    old_fp = st.session_state['custom_fingerprint']
+    st.session_state['workspace'].pop(tn, None)
+    st.session_state['workspace_indexes'] = [s for s in st.session_state['workspace_indexes'] if s.table != tn]
+    if st.session_state['custom_table_name'] == tn: st.session_state['custom_table_name'] = next(reversed(st.session_state['workspace']), None)
+    _workspace_changed(old_fp)
+
+def reset_dataset():
+    drop_workspace_db(st.session_state['custom_fingerprint'])
+    st.session_state['workspace']={}; st.session_state['workspace_indexes']=[]; st.session_state['custom_table_name']=None
+    st.session_state['custom_fingerprint']=None; st.session_state['imported_uploads']=set()
+    st.session_state['uploader_key'] += 1  # svuota l'uploader, altrimenti i file tornerebbero subito
+
+def has_dataset():
+    return st.session_state['custom_fingerprint'] is not None
+
+def dataset_source():
+    # In modalità streaming in sessione resta solo l'anteprima, i dati sono nello store;
+    # i DataFrame scaricati su disco dall'accountant si ricaricano solo se servono
+    # (database SQLite da caricare o query DuckDB), non a ogni RUN
+    return {tn: t['source'] for tn, t in st.session_state['workspace'].items()}
+
+def index_setup():
+    # Indici creati in questa sessione: ricreati se il database viene ricaricato
+    return tuple(s.sql for s in st.session_state['workspace_indexes'])
+
+def table_name_for(file_name, sheet=None):
+    tn = file_name.split('.')[0].replace(" ", "_").lower()
+    if sheet: tn += "_" + re.sub(r"\W+", "_", sheet).strip("_").lower()
+    return tn
+
+def replaced_tables(up_file):
+    # Tabelle importate da un upload precedente con lo stesso nome di file: il nuovo le sostituisce
+    return [tn for tn, t in st.session_state['workspace'].items() if t['file'] == up_file.name and t.get('upload') != up_file.file_id]
+
+def replace_tables(replaced, added):
+    # Le tabelle del vecchio upload che il nuovo non ricrea (fogli diversi) escono dal workspace
+    for tn in replaced:
+        if tn not in added: remove_table(tn)
+
+def check_capacity(table_names, replaced=()):
+    ws = [tn for tn in st.session_state['workspace'] if tn not in replaced]
+    if len(ws) + len([tn for tn in table_names if tn not in ws]) > ingest.MAX_TABLES:
+        raise ValueError(f"Workspace pieno: al massimo {ingest.MAX_TABLES} tabelle.")
+
+@metrics.timed("upload_parse")
+def load_upload(up_file):
+    fp = fingerprint_bytes(up_file.getvalue())
+    tn = table_name_for(up_file.name)
+    replaced = replaced_tables(up_file)
+    check_capacity([tn], replaced)
+    if ingest.use_streaming(up_file.size):
+        bar = st.progress(0.0, text="Importazione...")
+        res = ingest.stream_to_store(up_file, up_file.name, tn, fp, progress=lambda f, n: bar.progress(f, text=f"Importazione... {n:,} righe"))
+        if res['truncated']: st.warning(f"File troncato a {res['rows']:,} righe.")
+        source, preview = res['path'], res['preview']
+    else:
+        ingest.check_size(up_file.size)
+        def parse():
+            up_file.seek(0)
+            return ingest.compact_dtypes(pd.read_csv(up_file))
+        # Stessi byte già visti (anche da altre sessioni): lettura dalla cache colonnare
+        df = columnar_cache.cached_read(fp, parse)
+        # copy(): una vista terrebbe in vita l'intero DataFrame anche dopo lo scarico su disco
+        source, preview = memory_accountant.register(st.session_state['session_id'], tn, df), df.head(5).copy()
+    # Ogni file diventa una tabella del workspace (stesso nome: la sostituisce)
+    replace_tables(replaced, [tn])
+    add_table(tn, {"fingerprint": fp, "source": source, "preview": preview, "file": up_file.name, "upload": up_file.file_id})
+    st.session_state['imported_uploads'].add(up_file.file_id)
+    return tn
+
+@metrics.timed("upload_parse_excel")
+def load_excel(up_file, sheets):
+    """Importa in background i fogli scelti di un .xlsx: ogni foglio diventa una tabella.
+
+    sheets = [None] importa solo il primo foglio con il nome del file.
+    """
+    data = up_file.getvalue()
+    fp = fingerprint_bytes(data)
+    tables = {sheet: table_name_for(up_file.name, sheet) for sheet in sheets}
+    replaced = replaced_tables(up_file)
+    check_capacity(tables.values(), replaced)
+    ingest.check_size(up_file.size)
+    streaming = ingest.use_streaming(up_file.size)
+    status = {}
+
+    def work(cancel):
+        out = []
+        for i, sheet in enumerate(sheets):
+            if cancel.is_set(): break
+            step = f"Foglio {i + 1}/{len(sheets)}" + (f": {sheet}" if sheet else "")
+            status['text'] = step
+            sheet_fp = fingerprint_bytes(f"{fp}:{sheet}".encode()) if sheet else fp
+            if streaming:
+                res = ingest.stream_to_store(io.BytesIO(data), up_file.name, tables[sheet], sheet_fp, sheet=sheet,
+                                             progress=lambda f, n: status.update(text=f"{step} · {n:,} righe"))
+                out.append({"sheet": sheet, "fingerprint": sheet_fp, "source": res['path'], "preview": res['preview'], "rows": res['rows'], "truncated": res['truncated']})
+            else:
+                parse = lambda: ingest.compact_dtypes(ingest.read_excel_sheet(io.BytesIO(data), sheet))
+                df = columnar_cache.cached_read(sheet_fp, parse)
+                out.append({"sheet": sheet, "fingerprint": sheet_fp, "source": df, "preview": df.head(5).copy(), "rows": len(df), "truncated": False})
+        return out
+
+    cancel = threading.Event()
+    # Con Annulla il run si interrompe e il lavoro si ferma dopo il foglio in corso:
+    # i fogli già letti vengono aggiunti al run successivo (finish_excel)
+    st.session_state['excel_job'] = {"file": up_file.name, "upload": up_file.file_id, "tables": tables, "sheets": len(sheets),
+                                     "streaming": streaming, "replaced": replaced, "future": init_run_executor().submit(work, cancel=cancel)}
+    try: wait_for(st.session_state['excel_job']['future'], label="Lettura del file Excel...", status=status, cancel=cancel)
+    except Exception:
+        del st.session_state['excel_job']; raise
+    return finish_excel()
+
+def finish_excel():
+    """Aggiunge al workspace i fogli letti dall'ultimo import Excel, anche se annullato a metà"""
+    job = st.session_state.pop('excel_job')
+    results, tables = job['future'].result(), job['tables']
+    if results: replace_tables(job['replaced'], [tables[r['sheet']] for r in results])
+    for r in results:
+        tn = tables[r['sheet']]
+        if r['truncated']: st.warning(f"{tn}: troncata a {r['rows']:,} righe.")
+        source = r['source'] if job['streaming'] else memory_accountant.register(st.session_state['session_id'], tn, r['source'])
+        add_table(tn, {"fingerprint": r['fingerprint'], "source": source, "preview": r['preview'], "file": job['file'], "upload": job['upload']})
+    # Import annullato a metà: il file si potrà importare di nuovo
+    if len(results) == job['sheets']: st.session_state['imported_uploads'].add(job['upload'])
+    else: st.toast(f"Import annullato: {len(results)} fogli su {job['sheets']} importati.", icon="⏹️")
+    return [tables[r['sheet']] for r in results]
+
+def run_in_background(fn, *args, label="Esecuzione in corso...", status=None):
+    # Il lavoro gira fuori dal thread dello script; se il run viene interrotto
+    # (bottone Annulla o qualsiasi altra interazione) l'evento cancel lo ferma.
+    # status è un dict che il lavoro può aggiornare ('text') per mostrare l'avanzamento
+    cancel = threading.Event()
+    return wait_for(init_run_executor().submit(fn, *args, cancel=cancel), label=label, status=status, cancel=cancel)
+
+def wait_for(future, label="Esecuzione in corso...", status=None, cancel=None):
+    # Attesa di un Future con tempo trascorso e bottone Annulla (senza cancel il lavoro finisce da solo)
+    try: return future.result(timeout=0.3)
+    except FutureTimeout: pass
+    c_wait, c_stop = st.columns([4, 1])
+    wait, stop = c_wait.empty(), c_stop.empty()
+    # Chiave diversa per ogni attesa: RUN, verifica e indici possono attendere nello stesso run
+    st.session_state['wait_seq'] = st.session_state.get('wait_seq', 0) + 1
+    stop.button("⏹️ Annulla", key=f"run_cancel_{st.session_state['wait_seq']}")
+    start = time.time()
     try:
-        conn = sqlite3.connect(":memory:")
-        df.to_sql(table_name, conn, index=False, if_exists="replace")
-        return pd.read_sql_query(query, conn), None
-    except Exception as e: return None, str(e)
+        with st.spinner(label):
+            while not future.done():
+                wait.caption(f"⏳ {time.time() - start:.1f}s" + (f" · {status['text']}" if status and status.get('text') else ""))
+                time.sleep(0.2)
+    finally:
+        if cancel is not None: cancel.set()
+    wait.empty(); stop.empty()
+    return future.result()
+
+def run_sql_cancellable(code, stats=None):
+    args = (code, dataset_source(), st.session_state['custom_fingerprint'], st.session_state['sql_row_cap'])
+    engine, setup = st.session_state['sql_engine'], index_setup()
+    return run_in_background(lambda *a, cancel: run_query_on_csv(*a, cancel=cancel, engine=engine, setup=setup, stats=stats), *args, label="Query in esecuzione...")
+
+@metrics.timed("grade_sql")
+def grade_sql(res, code):
+    """True/False se il risultato coincide con quello della soluzione, None se non valutabile"""
+    lesson = st.session_state['lesson']
+    if not lesson or not lesson.get('soluzione'): return None
+    tables, fp = dataset_source(), st.session_state['custom_fingerprint']
+    engine, setup = st.session_state['sql_engine'], index_setup()
+    key = ((lesson.get('track'), lesson.get('codice_lezione'), fingerprint_bytes(lesson['soluzione'].encode())), fp, engine)
+
+    def reference(cancel):
+        def compute():
+            try: ref = sql_engines[engine].run(lesson['soluzione'], tables, fp, row_cap=grading.REFERENCE_ROW_CAP, cancel=cancel, setup=setup)
+            except sql_exec.QueryInterrupted:
+                if cancel.is_set(): raise  # annullata: si riprova al prossimo RUN
+                return None
+            except Exception: return None  # soluzione non applicabile a questo dataset
+            return None if ref.attrs.get('truncated') else grading.result_fingerprint(ref)
+        # Una sola esecuzione della soluzione per (lezione, dataset, motore)
+        return reference_cache.get(key, compute)
+
+    try: ref = run_in_background(reference, label="Verifica della soluzione...")
+    except sql_exec.QueryInterrupted: return None
+    if ref is None: return None
+    if res.attrs.get('truncated'):
+        # In pagina ci sono solo le prime righe: serve il risultato completo (fino a ref.rows)
+        if len(res) >= ref.rows: return False
+        res, err = run_in_background(lambda cancel: run_query_on_csv(code, tables, fp, row_cap=ref.rows, cancel=cancel, engine=engine, setup=setup), label="Verifica della soluzione...")
+        if err: return None
+        if res.attrs.get('truncated'): return False
+    if (len(res), res.shape[1]) != (ref.rows, ref.cols): return False
+    return grading.result_fingerprint(res) == ref
+
+@metrics.timed("advise_indexes")
+def advise_indexes(code):
+    """Indici per le scansioni complete della query: creati (e ricordati nella sessione) o solo suggeriti"""
+    tables, fp, setup = dataset_source(), st.session_state['custom_fingerprint'], index_setup()
+    if index_advisor.MODE == "off": return []
+    # DuckDB non usa gli indici, salvo quando ripiega su SQLite per gli store su disco
+    if st.session_state['sql_engine'] != 'sqlite' and not any(isinstance(src, str) for src in tables.values()): return []
+
+    fps, session_id = {tn: t['fingerprint'] for tn, t in st.session_state['workspace'].items()}, st.session_state['session_id']
+
+    def work(cancel):
+        with query_cache.connection(fp, tables, setup) as conn: found = index_advisor.suggest(conn, code)
+        if not found or index_advisor.MODE != "create": return found, {}
+        # Gli store su disco sono condivisi tra le sessioni: gli indici vanno in una copia privata
+        private = {tn: {"source": ingest.private_store(tables[tn], session_id), "fingerprint": f"{fps[tn]}@{session_id}"}
+                   for tn in {s.table for s in found} if isinstance(tables.get(tn), str) and not isinstance(tables[tn], ingest.PrivateStore)}
+        new_fp = workspace_fingerprint({**fps, **{tn: p['fingerprint'] for tn, p in private.items()}})
+        new_tables = {**tables, **{tn: p['source'] for tn, p in private.items()}}
+        with query_cache.writable(new_fp, new_tables, setup) as conn: return index_advisor.apply(conn, code, found), private
+
+    found, private = run_in_background(work, label="Analisi del piano di esecuzione...")
+    if private:
+        old_fp = st.session_state['custom_fingerprint']
+        for tn, p in private.items(): st.session_state['workspace'][tn].update(p)
+        _workspace_changed(old_fp)
+    if index_advisor.MODE == "create": st.session_state['workspace_indexes'] += [s for s in found if s not in st.session_state['workspace_indexes']]
+    return found
+
+def load_more_rows():
+    st.session_state['sql_row_cap'] += sql_exec.ROW_CAP
+    st.session_state['sql_load_more'] = True
+
+@measured_fragment
+def syllabus_panel(track):
+    # Cambiare esercizio riesegue solo questo pannello
+    st.markdown("### 📚 Syllabus")
+    lezioni = get_lessons_from_db(track, st.session_state['difficulty'])
+    if lezioni:
+        s = st.selectbox("Esercizio:", list(lezioni.keys()))
+        d = st.session_state['lesson'] = lezioni[s]
+        st.markdown(f"#### {d['titolo']}\n{d['teoria']}")
+        st.info(f"**TASK:** {d['task']}")
+        with st.expander("🔍 Sintassi"): st.code(d['soluzione'], language=track.lower())
+    else:
+        st.session_state['lesson'] = None
+        st.warning("Lezioni non trovate.")
+
+@measured_fragment
+def terminal_panel(track):
+    # Editor e RUN si rieseguono da soli, senza CSS, sidebar e anteprima dati
+    st.markdown("### ⚡ Terminale")
+    ph = "-- Scrivi query..."
+    if has_dataset() and track == 'SQL':
+        ph = f"SELECT * FROM {st.session_state['custom_table_name']} LIMIT 5;"
+    
+    if track == 'SQL' and len(sql_engines) > 1:
+        names = list(sql_engines)
+        eng = st.radio("Motore SQL", names, index=names.index(st.session_state['sql_engine']), format_func=lambda n: sql_engines[n].label, horizontal=True)
+        if eng != st.session_state['sql_engine']: st.session_state['sql_engine'] = eng
+
+    from streamlit_ace import st_ace  # caricato solo quando si apre il DevLab
+    code = st_ace(value="", placeholder=ph, language=track.lower(), theme="monokai", height=400)
+    
+    c_run, c_prof = st.columns([3, 1])
+    run = c_run.button("▶️ RUN", type="primary", use_container_width=True)
+    prof = c_prof.button("⏱️ Profila", use_container_width=True, help="Esegue e misura: tempo, piano di esecuzione, righe lette, memoria")
+    if run or prof:
+        st.session_state['run_code'] = code
+        st.session_state['run_pending'] = True
+        st.session_state['run_profile'] = prof
+        st.session_state['sql_row_cap'] = sql_exec.ROW_CAP
+    output_panel(track)
+
+@measured_fragment
+def output_panel(track):
+    # "Carica altre righe" riesegue solo l'area di output
+    run_clicked = st.session_state.pop('run_pending', False)
+    load_more = st.session_state.pop('sql_load_more', False) and track == 'SQL'
+    if not (run_clicked or load_more): return
+    code = st.session_state['run_code']
+    # Il profilo riguarda solo il RUN, non "carica altre righe"
+    stats = {} if run_clicked and st.session_state.pop('run_profile', False) else None
+    st.markdown("### Output")
+    if track == 'SQL':
+        if has_dataset():
+            with metrics.span("run_query_on_csv", engine=st.session_state['sql_engine']):
+                res, err = run_sql_cancellable(code, stats)
+            if err: st.error(f"Errore SQL: {err}")
+            else: 
+                # XP solo sul RUN (non su "carica altre righe") e solo se il risultato è quello del task
+                verdict = grade_sql(res, code) if run_clicked else None
+                if verdict is False: st.warning("🤔 La query funziona, ma il risultato non è quello richiesto dal task.")
+                else:
+                    if run_clicked: st.balloons(); update_xp()
+                    st.success("✅ Risultato corretto!" if verdict else "✅ Query OK")
+                if run_clicked:
+                    for s in advise_indexes(code):
+                        if index_advisor.MODE == "create": st.caption(f"⚡ Creato l'indice `{s.name}` su `{s.table}({s.column})`: le prossime query non dovranno scandire tutta la tabella.")
+                        else: st.info(f"💡 Un indice su `{s.table}({s.column})` eviterebbe la scansione completa:\n```sql\n{s.sql};\n```")
+                with metrics.span("render_dataframe"): st.dataframe(res, use_container_width=True)
+                if res.attrs.get('truncated'):
+                    st.caption(f"Mostrate le prime {len(res):,} righe.")
+                    st.button("⬇️ Carica altre righe", on_click=load_more_rows)
+                if stats is not None:
+                    stats.update(rows_returned=len(res), truncated=bool(res.attrs.get('truncated')))
+                    profile_panel(track, code, stats)
+        else: st.warning("Carica un file!")
+    else:
+        with metrics.span("execute_python_code"):
+            out, err = run_in_background(lambda c, cancel: execute_python_code(c, cancel=cancel, stats=stats), code, label="Codice in esecuzione...")
+        if err: st.error(err)
+        else: 
+            st.balloons(); update_xp()
+            # FIX DEL DELTAGENERATOR: Niente istruzioni inline!
+            if out:
+                st.code(out)
+            else:
+                st.success("Codice eseguito con successo.")
+            if stats: profile_panel(track, code, stats)
+
+def profile_panel(track, code, stats):
+    """Mostra il profilo del RUN e lo aggiunge alla cronologia della sessione per il confronto"""
+    p = profiler.remember(st.session_state['profiles'], dict(stats, track=track, code=code, at=time.strftime("%H:%M:%S")))
+    st.markdown(f"#### ⏱️ Profilo #{p['n']}")
+    if track == 'SQL':
+        scanned = "n/d" if p.get('rows_scanned') is None else ("~" if p['engine'] == 'sqlite' else "") + f"{p['rows_scanned']:,}"
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Tempo", f"{p['ms']:.1f} ms")
+        c2.metric("Righe lette", scanned, help="DuckDB: righe lette dagli operatori di scansione. SQLite: stima, righe delle tabelle scandite per intero (le ricerche su indice non contano).")
+        c3.metric("Righe restituite", f"{p['rows_returned']:,}" + ("+" if p['truncated'] else ""))
+        note = f"Motore: {sql_engines[p['engine']].label}"
+        if p.get('vm_steps'): note += f" · ~{p['vm_steps']:,} istruzioni della VM SQLite"
+        if p['engine'] == 'duckdb' and p['truncated']: note += " · risultato troncato: piano stimato"
+        st.caption(note)
+        st.code("\n".join(p['plan']) or "Piano non disponibile.", language=None)
+    else:
+        c1, c2 = st.columns(2)
+        c1.metric("Tempo", f"{p['ms']:.1f} ms")
+        c2.metric("Picco memoria", f"{p['peak_kb'] / 1024:.2f} MB", help="Memoria allocata da Python e NumPy/pandas (tracemalloc)")
+        if p['functions']: st.dataframe(pd.DataFrame(p['functions']), hide_index=True, use_container_width=True)
+        st.caption("Tempi misurati sotto profiler: l'esecuzione normale è più veloce.")
+    history = [q for q in st.session_state['profiles'] if q['track'] == track]
+    if len(history) > 1:
+        with st.expander("📊 Confronta con i profili precedenti"):
+            st.dataframe(pd.DataFrame([{
+                "#": q['n'], "Ora": q['at'], "Codice": " ".join(q['code'].split())[:60], "Tempo (ms)": round(q['ms'], 1),
+                **({"Righe lette": q.get('rows_scanned'), "Righe restituite": q['rows_returned']} if track == 'SQL' else {"Picco (MB)": round(q['peak_kb'] / 1024, 2)})
+            } for q in reversed(history)]), hide_index=True, use_container_width=True)
+
+SESSION_COOKIE = "datagym_session"
+
+def apply_login(user, client, profile):
+    st.session_state['user'] = user
+    st.session_state['auth_client'] = client
+    st.session_state['username'] = user.email.split("@")[0]
+    if profile:
+        st.session_state['username'] = profile.get('username', user.email.split("@")[0])
+        st.session_state['xp'] = profile.get('xp', 0)
+        st.session_state['completed_tasks'] = profile.get('completed_tasks', 0)
+        for col in TRACK_COLUMNS.values(): st.session_state[col] = profile.get(col) or 0
+    remember_session(client)
+
+def sign_out():
+    auth.logout(st.session_state['auth_client'])
+    st.session_state['user'] = None; st.session_state['auth_client'] = None; st.session_state['cookie_pending'] = ""
+    st.session_state.pop('cookie_token', None); st.session_state.pop('logout_blocked', None)
+    st.session_state['username'] = "Ospite"; st.session_state['xp']=0
+    for col in TRACK_COLUMNS.values(): st.session_state[col] = 0
+    st.session_state['page'] = 'Home'; rerun()
 
+def remember_session(client):
+    # Il browser ricorda il refresh token della sessione. Supabase lo ruota a ogni rinnovo
+    # (ripristino, o get_session con il token di accesso scaduto): se cambia si riscrive il cookie
+    session = auth.current_session(client)
+    if not session or auth.REMEMBER_DAYS <= 0 or session.refresh_token == st.session_state.get('cookie_token'): return
+    st.session_state['cookie_token'] = st.session_state['cookie_pending'] = session.refresh_token
+
+def restore_session():
+    """Utente che torna: sessione ripresa dal cookie, senza password (una volta per sessione)"""
+    st.session_state['auth_checked'] = True
+    try: saved = st.context.cookies.get(SESSION_COOKIE)
+    except Exception: saved = None
+    if not isinstance(saved, str): return  # nessun cookie (o AppTest, senza browser)
+    token = unquote(saved)
+    if not token: return
+    user, client, profile, err = wait_for(auth.restore_async(token), label="Ripristino della sessione...")
+    if user: apply_login(user, client, profile)
+    else: st.session_state['cookie_pending'] = ""  # token scaduto o revocato: si cancella
+
+def write_session_cookie():
+    # Scritto dal browser al run successivo: un componente reso prima di st.rerun() non arriva mai
+    value = st.session_state.pop('cookie_pending', None)
+    if value is None: return
+    max_age = int(auth.REMEMBER_DAYS * 86400) if value else 0
+    # Streamlit non può mandare un Set-Cookie, quindi il cookie nasce da JavaScript e non può
+    # essere HttpOnly: uno script iniettato nella pagina (XSS) potrebbe leggere il refresh token.
+    # Secure lo limita a HTTPS, SameSite=Strict alle richieste dal sito stesso; chi non accetta
+    # il rischio disattiva il ricordo con DATAGYM_REMEMBER_DAYS=0.
+    script = f"<script>window.parent.document.cookie = '{SESSION_COOKIE}={quote(value, safe='')}; Max-Age={max_age}; Path=/; Secure; SameSite=Strict';</script>"
+    if hasattr(st, "iframe"): st.iframe(script, height=1)
+    else:
+        import streamlit.components.v1 as components  # Streamlit < st.iframe
+        components.html(script, height=0)
+
+@metrics.timed("update_xp")
 def update_xp():
+    track_col = TRACK_COLUMNS[st.session_state['track']]
     st.session_state['xp'] += 50
+    st.session_state[track_col] += 50
     st.session_state['completed_tasks'] += 1
     if st.session_state['user']:
-        try:
-            supabase.table("utenti_app").update({
-                "xp": st.session_state['xp'],
-                "completed_tasks": st.session_state['completed_tasks']
-            }).eq("auth_user_id", st.session_state['user'].id).execute()
-        except: pass
+        values = {"xp": st.session_state['xp'], "completed_tasks": st.session_state['completed_tasks']}
+        # XP per traccia solo se il database ha già le colonne (migrazione classifica)
+        if leaderboard.supports_tracks: values[track_col] = st.session_state[track_col]
+        leaderboard.remember(st.session_state['user'].id, st.session_state['username'])
+        # Write-behind: il salvataggio su Supabase avviene in background, accorpato
+        xp_writer.submit(st.session_state['user'].id, values, client=st.session_state['auth_client'])
     st.toast("+50 XP! 🚀", icon="🔥")
 
+def leaderboard_table(rows, column):
+    if not rows: st.caption("Ancora nessuno in classifica."); return
+    me = user_key(st.session_state['user'].id) if st.session_state['user'] else None
+    st.dataframe(pd.DataFrame([{
+        "#": i, "Utente": (r.get('username') or "Anonimo") + (" ⭐" if r.get('chiave_utente') == me else ""), "XP": r.get(column) or 0
+    } for i, r in enumerate(rows, 1)]), hide_index=True, use_container_width=True)
+
 def share_buttons():
     url = "https://datagym.streamlit.app"
     st.markdown(f"""
@@ -182,6 +717,9 @@ def share_buttons():
     """, unsafe_allow_html=True)
 
 # --- 4. SIDEBAR ---
+if not st.session_state['user'] and not st.session_state['auth_checked']: restore_session()
+elif st.session_state['user']: remember_session(st.session_state['auth_client'])
+
 with st.sidebar:
     st.markdown("## ⚡ DataGym")
     
@@ -194,10 +732,16 @@ with st.sidebar:
         st.caption(f"Livello: {int(st.session_state['xp']/500)+1} | XP: {st.session_state['xp']}")
         
         if st.button("Esci (Logout)"):
-            auth.logout(); st.session_state['user'] = None; st.session_state['username'] = "Ospite"; st.session_state['xp']=0; st.session_state['page'] = 'Home'; st.rerun()
+            # Con XP ancora in coda non si esce: dopo il sign-out i tentativi non avrebbero più il JWT dell'utente
+            if xp_writer.flush(st.session_state['user'].id): sign_out()
+            else: st.session_state['logout_blocked'] = True
+        if st.session_state.get('logout_blocked') and xp_writer.pending(st.session_state['user'].id):
+            st.error("XP non ancora salvati: riprova tra poco, oppure esci perdendo gli ultimi progressi.")
+            if st.button("Esci senza salvare"):
+                xp_writer.discard(st.session_state['user'].id); sign_out()
     else:
         st.info("Ospite")
-        if st.button("Accedi / Registrati"): st.session_state['page'] = 'Auth'; st.rerun()
+        if st.button("Accedi / Registrati"): st.session_state['page'] = 'Auth'; rerun()
 
     st.markdown("---")
     menu_options = ["Home", "DevLab", "Profilo"]
@@ -207,10 +751,11 @@ with st.sidebar:
     
     if selected != st.session_state['page']:
         if not (st.session_state['page'] == 'Auth' and selected == 'Home'):
-            st.session_state['page'] = selected; st.rerun()
+            st.session_state['page'] = selected; rerun()
             
     st.markdown("---")
     st.link_button("✨ Chat con AI (Gemini)", "https://gemini.google.com/app", use_container_width=True, help="Apri Gemini per generare dataset.")
+    write_session_cookie()
 
 # --- 5. ROUTING ---
 
@@ -223,24 +768,16 @@ if st.session_state['page'] == 'Auth':
         with tab_log:
             e = st.text_input("Email"); p = st.text_input("Password", type="password")
             if st.button("Entra", use_container_width=True):
-                u, err = auth.sign_in(e, p)
+                # Password e poi profilo utenti_app, fuori dal thread dello script
+                u, client, profile, err = wait_for(auth.sign_in_async(e, p), label="Accesso in corso...")
                 if u:
-                    st.session_state['user'] = u
-                    st.session_state['username'] = u.email.split("@")[0]
-                    try:
-                        d = supabase.table("utenti_app").select("*").eq("auth_user_id", u.id).execute()
-                        if d.data: 
-                            user_data = d.data[0]
-                            st.session_state['username'] = user_data.get('username', u.email.split("@")[0])
-                            st.session_state['xp'] = user_data.get('xp', 0)
-                            st.session_state['completed_tasks'] = user_data.get('completed_tasks', 0)
-                    except: pass
-                    st.success("Accesso riuscito!"); time.sleep(0.5); st.session_state['page']='Home'; st.rerun()
+                    apply_login(u, client, profile)
+                    st.toast("Accesso riuscito!", icon="✅"); st.session_state['page']='Home'; rerun()
                 else: st.error(err)
         with tab_reg:
             nu = st.text_input("Username"); ne = st.text_input("Email Reg"); np = st.text_input("Pass Reg", type="password")
             if st.button("Crea Account", use_container_width=True):
-                u, err = auth.sign_up(ne, np, nu)
+                u, err = run_in_background(lambda cancel: auth.sign_up(ne, np, nu), label="Registrazione in corso...")
                 if u: st.success("Creato! Accedi."); st.balloons()
                 else: st.error(err)
 
@@ -270,7 +807,7 @@ elif st.session_state['page'] == 'Home':
         </div>
         """, unsafe_allow_html=True)
         st.write("")
-        if st.button("Avvia SQL Lab"): st.session_state['track']='SQL'; st.session_state['page']='DevLab'; st.rerun()
+        if st.button("Avvia SQL Lab"): st.session_state['track']='SQL'; st.session_state['page']='DevLab'; rerun()
             
     with c2:
         st.markdown("""
@@ -282,7 +819,7 @@ elif st.session_state['page'] == 'Home':
         </div>
         """, unsafe_allow_html=True)
         st.write("")
-        if st.button("Avvia Python Lab"): st.session_state['track']='PYTHON'; st.session_state['page']='DevLab'; st.rerun()
+        if st.button("Avvia Python Lab"): st.session_state['track']='PYTHON'; st.session_state['page']='DevLab'; rerun()
 
     st.write("---")
     share_buttons()
@@ -292,16 +829,23 @@ elif st.session_state['page'] == 'DevLab':
     track = st.session_state['track']
     
     # 1. DASHBOARD
-    if st.session_state['custom_df'] is not None:
+    if has_dataset():
         with st.container():
-            st.warning(f"👉 **Tabella attiva:** `{st.session_state['custom_table_name']}`")
+            ws = st.session_state['workspace']
+            st.warning("👉 **Tabelle attive:** " + ", ".join(f"`{tn}`" for tn in ws))
             
             c_dash, c_btn = st.columns([6, 1])
             with c_dash: st.caption("Anteprima dati (prime 5 righe):")
             with c_btn:
                 if st.button("🗑️ Reset"):
-                    st.session_state['custom_df']=None; st.session_state['last_uploaded_file']=None; st.rerun()
-            st.dataframe(st.session_state['custom_df'].head(5), use_container_width=True)
+                    reset_dataset(); rerun()
+            for tab, (tn, t) in zip(st.tabs(list(ws)), list(ws.items())):
+                with tab:
+                    st.dataframe(t['preview'], use_container_width=True)
+                    if len(ws) > 1 and st.button("✖️ Rimuovi tabella", key=f"drop_{tn}"):
+                        remove_table(tn); rerun()
+            if st.session_state['workspace_indexes']:
+                st.caption("⚡ Indici: " + ", ".join(f"`{s.table}({s.column})`" for s in st.session_state['workspace_indexes']))
             st.divider()
 
     # 2. CONFIG
@@ -309,68 +853,47 @@ elif st.session_state['page'] == 'DevLab':
     with c1: st.markdown(f"## 🛠️ Lab: **{track}**")
     with c2:
         diff = st.selectbox("Livello", ["Principiante", "Intermedio", "Avanzato"], index=["Principiante", "Intermedio", "Avanzato"].index(st.session_state['difficulty']), label_visibility="collapsed")
-        if diff != st.session_state['difficulty']: st.session_state['difficulty']=diff; st.rerun()
+        if diff != st.session_state['difficulty']: st.session_state['difficulty']=diff; rerun()
     with c3:
-        if st.session_state['user']: st.button("💾 Salva XP")
+        if st.session_state['user']:
+            if st.button("💾 Salva XP"):
+                if xp_writer.flush(st.session_state['user'].id): st.toast("XP salvati!", icon="💾")
+                else: st.toast("Salvataggio non riuscito, nuovo tentativo a breve.", icon="⚠️")
         else: st.caption("🔒 Login req.")
 
     # 3. UPLOAD
-    with st.expander("📂 Carica CSV", expanded=False if st.session_state['custom_df'] is not None else True):
-        st.info("Genera un CSV con l'AI e caricalo qui.")
-        up_file = st.file_uploader("Upload", type=['csv', 'xlsx'])
-        if up_file:
-            if st.session_state['last_uploaded_file'] != up_file.name:
-                try:
-                    up_file.seek(0)
-                    df = pd.read_csv(up_file) if up_file.name.endswith('.csv') else pd.read_excel(up_file)
-                    st.session_state['custom_df'] = df
-                    tn = up_file.name.split('.')[0].replace(" ", "_").lower()
-                    st.session_state['custom_table_name'] = tn
-                    st.session_state['last_uploaded_file'] = up_file.name
-                    st.success(f"Caricato! Tabella: {tn}"); time.sleep(0.5); st.rerun()
-                except Exception as e: st.error(f"Errore: {e}")
+    with st.expander("📂 Carica CSV / Excel", expanded=False if has_dataset() else True):
+        st.info("Genera un CSV con l'AI e caricalo qui. Più file = più tabelle, da unire con JOIN.")
+        up_files = st.file_uploader("Upload", type=['csv', 'xlsx'], accept_multiple_files=True, key=f"uploader_{st.session_state['uploader_key']}")
+        loaded = []
+        if 'excel_job' in st.session_state:
+            # Import Excel interrotto dal run precedente: il lavoro finisce il foglio in corso
+            job = st.session_state['excel_job']
+            try:
+                wait_for(job['future'], label="Chiusura dell'import annullato...")
+                loaded += finish_excel()
+            except Exception as e:
+                st.session_state.pop('excel_job', None); st.error(f"Errore ({job['file']}): {e}")
+        for up_file in up_files or []:
+            if up_file.file_id in st.session_state['imported_uploads']: continue
+            try:
+                if up_file.name.endswith('.xlsx'):
+                    sheets = ingest.excel_sheets(up_file)
+                    if len(sheets) > 1:
+                        # Più fogli: si scelgono quelli da importare, ognuno diventa una tabella
+                        picked = st.multiselect(f"Fogli di {up_file.name}", sheets, default=sheets[:1], key=f"sheets_{up_file.file_id}")
+                        if not st.button("📥 Importa fogli", key=f"import_{up_file.file_id}", disabled=not picked): continue
+                        loaded += load_excel(up_file, picked)
+                    else: loaded += load_excel(up_file, [None])
+                else: loaded.append(load_upload(up_file))
+            except Exception as e: st.error(f"Errore ({up_file.name}): {e}")
+        if loaded:
+            st.toast(f"Caricato! Tabelle: {', '.join(loaded)}", icon="📂"); rerun()
 
     # 4. WORKSPACE
     col_t, col_e = st.columns([1, 1.8], gap="medium")
-    with col_t:
-        st.markdown("### 📚 Syllabus")
-        lezioni = get_lessons_from_db(track, st.session_state['difficulty'])
-        if lezioni:
-            s = st.selectbox("Esercizio:", list(lezioni.keys()))
-            d = lez = lezioni[s]
-            st.markdown(f"#### {d['titolo']}\n{d['teoria']}")
-            st.info(f"**TASK:** {d['task']}")
-            with st.expander("🔍 Sintassi"): st.code(d['soluzione'], language=track.lower())
-        else: st.warning("Lezioni non trovate.")
-
-    with col_e:
-        st.markdown("### ⚡ Terminale")
-        ph = "-- Scrivi query..."
-        if st.session_state['custom_df'] is not None and track == 'SQL':
-            ph = f"SELECT * FROM {st.session_state['custom_table_name']} LIMIT 5;"
-        
-        code = st_ace(value="", placeholder=ph, language=track.lower(), theme="monokai", height=400)
-        
-        if st.button("▶️ RUN", type="primary", use_container_width=True):
-            st.markdown("### Output")
-            if track == 'SQL':
-                if st.session_state['custom_df'] is not None:
-                    res, err = run_query_on_csv(code, st.session_state['custom_df'], st.session_state['custom_table_name'])
-                    if err: st.error(f"Errore SQL: {err}")
-                    else: 
-                        st.balloons(); update_xp()
-                        st.success("✅ Query OK"); st.dataframe(res, use_container_width=True)
-                else: st.warning("Carica un file!")
-            else:
-                out, err = execute_python_code(code)
-                if err: st.error(err)
-                else: 
-                    st.balloons(); update_xp()
-                    # FIX DEL DELTAGENERATOR: Niente istruzioni inline!
-                    if out:
-                        st.code(out)
-                    else:
-                        st.success("Codice eseguito con successo.")
+    with col_t: syllabus_panel(track)
+    with col_e: terminal_panel(track)
 
 # PROFILO
 elif st.session_state['page'] == 'Profilo':
@@ -382,7 +905,8 @@ elif st.session_state['page'] == 'Profilo':
             st.caption(st.session_state['user'].email)
             st.success("Account Verificato")
             
-            # GRAFICO RADAR
+            # GRAFICO RADAR (plotly viene importato solo qui)
+            import plotly.express as px
             base_val = min(st.session_state['xp'] / 100, 10)
             df_radar = pd.DataFrame(dict(
                 r=[base_val, base_val*0.8, base_val*1.2, st.session_state['completed_tasks'], 5],
@@ -407,9 +931,39 @@ elif st.session_state['page'] == 'Profilo':
             k3.markdown(f"<div class='stat-box'><div class='stat-number'>{int(st.session_state['xp']/500)+1}</div><div class='stat-label'>Lv</div></div>", unsafe_allow_html=True)
             st.write("")
             st.progress((st.session_state['xp'] % 500) / 500, text="Progresso Livello")
+
+            # CLASSIFICA: servita dalla cache condivisa, nessuna query per pagina vista
+            st.markdown("### 🥇 Classifica")
+            t_all, t_sql, t_py = st.tabs(["Globale", "SQL", "Python"])
+            with t_all: leaderboard_table(leaderboard.get(), "xp")
+            for tab, track in ((t_sql, "SQL"), (t_py, "PYTHON")):
+                with tab:
+                    rows = leaderboard.get(track)
+                    if rows is None: st.caption("Classifica per traccia non ancora disponibile.")
+                    else: leaderboard_table(rows, TRACK_COLUMNS[track])
         
         st.write("---")
         share_buttons()
     else: st.warning("Accedi per vedere il tuo profilo.")
 
-st.markdown('<div class="footer">Francesco Pagliara | Data Management & BI Research Project</div>', unsafe_allow_html=True)
\ No newline at end of file
+st.markdown('<div class="footer">Francesco Pagliara | Data Management & BI Research Project</div>', unsafe_allow_html=True)
+
+# --- 6. DEBUG: TEMPI (opt-in: DATAGYM_DEBUG_PANEL=1 oppure ?debug=1) E MEMORIA (solo admin) ---
+rerun_spans = metrics.end_rerun()
+if debug_timing():
+    with st.sidebar.expander("🐞 Tempi del rerun", expanded=True):
+        timing_table(rerun_spans)
+        if st.session_state.get('fragment_spans'):
+            # RUN, cambio esercizio, "carica altre righe": rieseguono solo un fragment
+            st.caption("Ultimo fragment:"); timing_table(st.session_state['fragment_spans'])
+        if metrics.METRICS_PORT: st.caption(f"Metriche: http://{metrics.METRICS_HOST}:{metrics.METRICS_PORT}/metrics")
+# Sessioni e memoria di tutto il processo: mai da un parametro dell'URL, solo per deployment o per admin
+if metrics.DEBUG_PANEL or auth.is_admin(st.session_state['user']):
+    with st.sidebar.expander("🧠 Memoria sessioni", expanded=False):
+        used, budget = memory_accountant.total_size / 1024 / 1024, memory_accountant.budget / 1024 / 1024
+        duck = f" · cache DuckDB: {sql_engines['duckdb'].total_size / 1024 / 1024:.1f} MB" if 'duckdb' in sql_engines else ""
+        st.caption(f"DataFrame in RAM: {used:.1f} / {budget:.0f} MB · cache SQLite: {query_cache.total_size / 1024 / 1024:.1f} MB{duck} · questa sessione: `{st.session_state['session_id']}`")
+        sessions = memory_accountant.snapshot()
+        if sessions: st.dataframe(pd.DataFrame(sessions), hide_index=True, use_container_width=True)
+    if st.sidebar.button("🔄 Ricarica lezioni", help="Rilegge il catalogo da Supabase senza aspettare il TTL"):
+        lesson_catalog.invalidate(); st.toast("Catalogo lezioni in aggiornamento.", icon="🔄")
\ No newline at end of file
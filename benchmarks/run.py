@@ -0,0 +1,251 @@
+"""Benchmark headless di DataGym.
+
+Esegue app.py con Streamlit AppTest e client Supabase finti (benchmarks/stubs.py)
+e misura: rerun completo di ogni pagina, RUN SQL/Python nel DevLab, import
+CSV/XLSX a varie dimensioni, motori SQL e pool Python. I risultati sono JSON,
+confrontabili tra due esecuzioni.
+
+Uso:
+    python benchmarks/run.py                          # scrive bench_results.json
+    python benchmarks/run.py --repeat 10 --out nuovo.json
+    python benchmarks/run.py --only ingest query      # solo alcuni gruppi
+    python benchmarks/run.py --compare vecchio.json nuovo.json
+"""
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "app.py")
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault("SUPABASE_URL", "http://supabase.bench.invalid")
+os.environ.setdefault("SUPABASE_KEY", "bench")
+os.environ.setdefault("DATAGYM_CACHE_DIR", tempfile.mkdtemp(prefix="datagym-bench-"))
+
+from benchmarks import stubs  # noqa: E402
+
+stubs.install()
+
+import pandas as pd  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+PAGES = ["Home", "DevLab", "Profilo", "Auth"]
+INGEST_SIZES = [1_000, 10_000, 100_000]
+XLSX_MAX_ROWS = 10_000  # oltre, openpyxl rende il benchmark troppo lungo
+QUERY_ROWS = 100_000
+
+
+def sample_df(rows):
+    return pd.DataFrame({
+        "id": range(rows),
+        "categoria": [f"cat_{i % 20}" for i in range(rows)],
+        "importo": [(i * 37 % 1000) / 10 for i in range(rows)],
+        "data": pd.date_range("2024-01-01", periods=rows, freq="min").astype(str),
+    })
+
+
+def measure(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def summarize(samples):
+    return {
+        "median_ms": round(statistics.median(samples), 3),
+        "min_ms": round(min(samples), 3),
+        "max_ms": round(max(samples), 3),
+        "n": len(samples),
+    }
+
+
+def new_app(page, **state):
+    at = AppTest.from_file(APP, default_timeout=120)
+    at.session_state['page'] = page
+    for key, value in state.items(): at.session_state[key] = value
+    return at
+
+
+def dataset_state(df, fingerprint="bench"):
+    workspace = {"dati": {"fingerprint": fingerprint, "source": df, "preview": df.head(5), "file": "dati.csv"}}
+    return dict(workspace=workspace, custom_fingerprint=fingerprint, custom_table_name="dati")
+
+
+def bench_pages(repeat, results):
+    for page in PAGES:
+        state = {"user": stubs.FakeUser()} if page == "Profilo" else {}
+        at = new_app(page, **state)
+        results[f"rerun.{page.lower()}.first"] = summarize(measure(at.run, 1))
+        results[f"rerun.{page.lower()}.warm"] = summarize(measure(at.run, repeat))
+        if at.exception: raise RuntimeError(f"{page}: {at.exception}")
+
+
+def _click_run(at):
+    [b for b in at.button if "RUN" in b.label][0].click().run()
+    if at.exception: raise RuntimeError(str(at.exception))
+
+
+def bench_devlab_run(repeat, results):
+    df = sample_df(QUERY_ROWS)
+    at = new_app("DevLab", **dataset_state(df))
+    at.run()
+    stubs.EDITOR["code"] = "SELECT categoria, COUNT(*) n, AVG(importo) media FROM dati GROUP BY categoria"
+    results["devlab.run_sql.first"] = summarize(measure(lambda: _click_run(at), 1))
+    results["devlab.run_sql"] = summarize(measure(lambda: _click_run(at), repeat))
+    # Soluzione della lezione: esecuzione e query di riferimento nello stesso run (due attese)
+    stubs.EDITOR["code"] = stubs.LESSONS[0]["soluzione"]
+    results["devlab.run_sql.graded"] = summarize(measure(lambda: _click_run(at), repeat))
+    at.session_state['track'] = "PYTHON"; at.run()
+    stubs.EDITOR["code"] = "import pandas as pd\nprint(pd.Series(range(1000)).sum())"
+    results["devlab.run_python.first"] = summarize(measure(lambda: _click_run(at), 1))
+    results["devlab.run_python"] = summarize(measure(lambda: _click_run(at), repeat))
+
+
+class _Upload(io.BytesIO):
+    """Stand-in per UploadedFile di Streamlit"""
+
+    def __init__(self, data, name):
+        super().__init__(data)
+        self.name = name
+        self.size = len(data)
+
+
+def bench_ingest(repeat, results):
+    from modules import ingest, columnar_cache
+    from modules.query_cache import fingerprint_bytes
+    for rows in INGEST_SIZES:
+        df = sample_df(rows)
+        csv = df.to_csv(index=False).encode()
+        results[f"ingest.csv.{rows}.read_csv"] = summarize(measure(lambda: pd.read_csv(io.BytesIO(csv)), repeat))
+        runs = iter(range(repeat))
+        results[f"ingest.csv.{rows}.stream"] = summarize(measure(
+            lambda: ingest.stream_to_store(_Upload(csv, "dati.csv"), "dati.csv", "dati", f"bench-{rows}-{next(runs)}"), repeat))
+        fp = fingerprint_bytes(csv)
+        columnar_cache.cached_read(fp, lambda: pd.read_csv(io.BytesIO(csv)))
+        results[f"ingest.csv.{rows}.columnar_hit"] = summarize(measure(
+            lambda: columnar_cache.cached_read(fp, lambda: pd.read_csv(io.BytesIO(csv))), repeat))
+        if rows <= XLSX_MAX_ROWS:
+            buf = io.BytesIO(); df.to_excel(buf, index=False); xlsx = buf.getvalue()
+            results[f"ingest.xlsx.{rows}.read_excel"] = summarize(measure(lambda: pd.read_excel(io.BytesIO(xlsx)), repeat))
+            results[f"ingest.xlsx.{rows}.{ingest.EXCEL_ENGINE}"] = summarize(measure(lambda: ingest.read_excel_sheet(io.BytesIO(xlsx)), repeat))
+
+
+QUERIES = {
+    "filter": "SELECT * FROM dati WHERE importo > 50 LIMIT 100",
+    "aggregate": "SELECT categoria, COUNT(*) n, SUM(importo) tot FROM dati GROUP BY categoria",
+    "window": "SELECT id, importo, SUM(importo) OVER (PARTITION BY categoria ORDER BY id) cum FROM dati",
+    "self_join": "SELECT a.categoria, COUNT(*) FROM dati a JOIN dati b ON a.id = b.id GROUP BY a.categoria",
+}
+
+
+def bench_query(repeat, results):
+    from modules.query_cache import DatasetCache
+    from modules import engines
+    df = sample_df(QUERY_ROWS)
+    cache = DatasetCache()
+    runs = iter(range(repeat))
+
+    def load():
+        with cache.connection(f"load-{next(runs)}", {"dati": df}): pass
+
+    results["run_query_on_csv.sqlite.load"] = summarize(measure(load, repeat))
+    for name, engine in engines.available_engines(cache).items():
+        for label, query in QUERIES.items():
+            engine.run(query, {"dati": df}, "bench")
+            results[f"run_query_on_csv.{name}.{label}"] = summarize(measure(
+                lambda: engine.run(query, {"dati": df}, "bench"), repeat))
+
+
+def bench_python(repeat, results):
+    from modules.sandbox import PythonPool
+    holder = {}
+    # Avvio del pool fino al primo job completato (worker pronti)
+    results["execute_python_code.pool_start"] = summarize(measure(lambda: holder.setdefault("pool", PythonPool()).run("pass"), 1))
+    pool = holder["pool"]
+    scripts = {
+        "print": "print('ok')",
+        "pandas": "import pandas as pd\ndf = pd.DataFrame({'a': range(10000)})\nprint(df.a.sum())",
+        "loop": "print(sum(i * i for i in range(200000)))",
+    }
+    for label, code in scripts.items():
+        results[f"execute_python_code.{label}"] = summarize(measure(lambda: pool.run(code), repeat))
+
+
+GROUPS = {
+    "pages": bench_pages,
+    "devlab": bench_devlab_run,
+    "ingest": bench_ingest,
+    "query": bench_query,
+    "python": bench_python,
+}
+
+
+def run(repeat, only):
+    results, failed = {}, []
+    for name, fn in GROUPS.items():
+        if only and name not in only: continue
+        print(f"[bench] {name}...", file=sys.stderr)
+        # Un gruppo che fallisce non ferma gli altri, ma la suite esce con errore
+        try: fn(repeat, results)
+        except Exception as e:
+            print(f"[bench] {name} FALLITO: {type(e).__name__}: {e}", file=sys.stderr)
+            failed.append(name)
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pandas": pd.__version__,
+            "repeat": repeat,
+        },
+        "results": results,
+        "failed": failed,
+    }
+
+
+def compare(old_path, new_path, threshold):
+    with open(old_path) as f: old = json.load(f)["results"]
+    with open(new_path) as f: new = json.load(f)["results"]
+    regressions = 0
+    print(f"{'benchmark':<45} {'prima':>10} {'dopo':>10} {'delta':>8}")
+    for key in sorted(set(old) | set(new)):
+        if key not in old or key not in new:
+            print(f"{key:<45} {'solo in ' + ('dopo' if key in new else 'prima'):>30}")
+            continue
+        a, b = old[key]["median_ms"], new[key]["median_ms"]
+        delta = (b - a) / a if a else 0.0
+        flag = ""
+        if delta > threshold: flag = "  <-- regressione"; regressions += 1
+        print(f"{key:<45} {a:>9.2f}ms {b:>9.2f}ms {delta:>+7.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark headless di DataGym")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--only", nargs="*", choices=list(GROUPS))
+    parser.add_argument("--compare", nargs=2, metavar=("PRIMA", "DOPO"))
+    parser.add_argument("--threshold", type=float, default=0.10, help="soglia di regressione per --compare")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.threshold) else 0)
+    report = run(args.repeat, args.only)
+    with open(args.out, "w") as f: json.dump(report, f, indent=2)
+    print(f"[bench] risultati in {args.out}", file=sys.stderr)
+    if report["failed"]: sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Controllo del tempo di avvio a freddo di app.py.
+
+Ogni misura gira in un processo Python nuovo: primo render della Home con
+AppTest (import dell'app compresi, esclusi quelli di Streamlit stesso).
+Fallisce (exit code 1) se la mediana supera il target o se la Home carica
+moduli pesanti che servono solo ad altre pagine (oltre a quelli che
+Streamlit importa già per conto suo).
+
+Uso:
+    python benchmarks/startup.py                  # target da DATAGYM_STARTUP_TARGET_MS (default 1500)
+    python benchmarks/startup.py --runs 5 --target-ms 1000
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Moduli che la Home non deve importare (servono a Profilo e DevLab)
+LAZY_MODULES = ["plotly", "streamlit_ace"]
+
+_PROBE = """
+import os, sys, json, time
+sys.path.insert(0, {root!r})
+os.environ.setdefault("SUPABASE_URL", "http://supabase.startup.invalid")
+os.environ.setdefault("SUPABASE_KEY", "startup")
+import streamlit
+from streamlit.testing.v1 import AppTest
+preloaded = set(sys.modules)  # ciò che carica Streamlit stesso (es. plotly per il tema) non conta
+at = AppTest.from_file({app!r}, default_timeout=120)
+start = time.perf_counter()
+at.run()
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({{"ms": elapsed, "error": str(at.exception) if at.exception else None,
+                  "loaded": [m for m in {lazy!r} if m in sys.modules and m not in preloaded]}}))
+"""
+
+
+def probe():
+    code = _PROBE.format(root=ROOT, app=os.path.join(ROOT, "app.py"), lazy=LAZY_MODULES)
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=ROOT)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Controllo avvio a freddo di DataGym")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--target-ms", type=float, default=float(os.getenv("DATAGYM_STARTUP_TARGET_MS", "1500")))
+    args = parser.parse_args()
+
+    results = [probe() for _ in range(args.runs)]
+    errors = [r["error"] for r in results if r["error"]]
+    loaded = sorted({m for r in results for m in r["loaded"]})
+    median = statistics.median(r["ms"] for r in results)
+    print(f"avvio a freddo (Home): mediana {median:.0f} ms su {args.runs} run, target {args.target_ms:.0f} ms")
+
+    failures = []
+    if errors: failures.append(f"errore nel render della Home: {errors[0]}")
+    if loaded: failures.append(f"moduli pesanti importati dalla Home: {', '.join(loaded)}")
+    if median > args.target_ms: failures.append(f"mediana {median:.0f} ms oltre il target di {args.target_ms:.0f} ms")
+    for f in failures: print(f"FAIL: {f}")
+    if not failures: print("OK")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Client Supabase finti per eseguire app.py senza rete.
+
+install() registra un modulo `supabase` fittizio in sys.modules (usato sia da
+app.py sia da modules/auth.py) e sostituisce l'editor st_ace con un valore
+impostabile dal benchmark.
+"""
+import sys
+import types
+
+LESSONS = [
+    {"track": track, "livello": livello, "codice_lezione": f"{i:02d}", "titolo": f"Lezione {i}",
+     "teoria": "Teoria di prova.", "task": "Seleziona tutte le righe.",
+     "soluzione": "SELECT * FROM dati" if track == "SQL" else "print(1)"}
+    for track in ["SQL", "PYTHON"]
+    for livello in ["Principiante", "Intermedio", "Avanzato"]
+    for i in range(1, 11)
+]
+
+# Codice restituito dall'editor st_ace finto
+EDITOR = {"code": ""}
+
+
+class FakeUser:
+    def __init__(self, email="bench@datagym.local"):
+        self.id = "00000000-0000-0000-0000-000000000000"
+        self.email = email
+
+
+class _Response:
+    def __init__(self, data):
+        self.data = data
+
+
+class _Query:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def select(self, *args, **kwargs): return self
+    def update(self, *args, **kwargs): return self
+    def insert(self, *args, **kwargs): return self
+    def upsert(self, *args, **kwargs): return self
+    def order(self, *args, **kwargs): return self
+    def limit(self, *args, **kwargs): return self
+
+    def eq(self, column, value):
+        return _Query([r for r in self._rows if r.get(column, value) == value])
+
+    def execute(self):
+        return _Response(list(self._rows))
+
+
+class _Auth:
+    def sign_in_with_password(self, credentials):
+        return types.SimpleNamespace(user=FakeUser(credentials["email"]), session=None)
+
+    def sign_up(self, credentials):
+        return types.SimpleNamespace(user=FakeUser(credentials["email"]), session=None)
+
+    def refresh_session(self, refresh_token):
+        return types.SimpleNamespace(user=FakeUser(), session=None)
+
+    def get_session(self): return None
+    def reset_password_email(self, email): pass
+    def sign_out(self, options=None): pass
+
+
+TABLES = {"lezioni": LESSONS, "utenti_app": []}
+
+
+class FakeClient:
+    def __init__(self):
+        self.auth = _Auth()
+        self.tables = TABLES  # stesso "database" per il client condiviso e per quelli di sessione
+
+    def table(self, name):
+        return _Query(self.tables.get(name, []))
+
+
+def install():
+    fake = types.ModuleType("supabase")
+    fake.Client = FakeClient
+    fake.ClientOptions = type("ClientOptions", (), {})  # senza httpx_client: opzioni di default
+    fake.create_client = lambda url, key, *args, **kwargs: FakeClient()
+    sys.modules["supabase"] = fake
+
+    import streamlit_ace
+    streamlit_ace.st_ace = lambda *args, **kwargs: EDITOR["code"]
@@ -1,36 +1,92 @@
 import os
-from supabase import create_client, Client
-from dotenv import load_dotenv
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from modules import db
+from modules import metrics
 
-load_dotenv()
+# Giorni per cui il browser ricorda la sessione (0 = login a ogni visita)
+REMEMBER_DAYS = float(os.getenv("DATAGYM_REMEMBER_DAYS", "30"))
+# Email degli amministratori (separate da virgola): vedono i pannelli di gestione del processo
+ADMIN_EMAILS = {e.strip().lower() for e in os.getenv("DATAGYM_ADMIN_EMAILS", "").split(",") if e.strip()}
 
-# Inizializzazione Client Supabase
-url: str = os.environ.get("SUPABASE_URL")
-key: str = os.environ.get("SUPABASE_KEY")
+_executor = None
+_executor_lock = threading.Lock()
 
-# Controllo sicurezza
-if not url or not key:
-    raise ValueError("⚠️ Manca SUPABASE_URL o SUPABASE_KEY nel file .env")
+def _client():
+    """Client Supabase condiviso con app.py (anonimo: solo operazioni senza login)"""
+    client = db.get_client()
+    # Controllo sicurezza
+    if client is None:
+        raise ValueError("⚠️ Manca SUPABASE_URL o SUPABASE_KEY nel file .env")
+    return client
 
-supabase: Client = create_client(url, key)
+def is_admin(user):
+    """True se l'utente autenticato è nella lista DATAGYM_ADMIN_EMAILS"""
+    return bool(user and user.email) and user.email.lower() in ADMIN_EMAILS
 
-def sign_in(email, password):
-    """Login professionale tramite Supabase Auth"""
-    try:
-        response = supabase.auth.sign_in_with_password({
-            "email": email,
-            "password": password
-        })
-        # Restituisce l'oggetto User e Session
-        return response.user, None
-    except Exception as e:
-        return None, str(e)
+def new_client():
+    """Client della sessione di un utente: il login non tocca il client condiviso"""
+    client = db.new_session_client()
+    if client is None:
+        raise ValueError("⚠️ Manca SUPABASE_URL o SUPABASE_KEY nel file .env")
+    return client
+
+def current_session(client):
+    """Token della sessione del client (None se non autenticato)"""
+    try: return client.auth.get_session()
+    except Exception: return None
+
+def _pool():
+    # Thread per le chiamate di login in parallelo, creati alla prima richiesta
+    global _executor
+    with _executor_lock:
+        if _executor is None: _executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="datagym-auth")
+    return _executor
+
+def _profile(client, user_id):
+    d = client.table("utenti_app").select("*").eq("auth_user_id", user_id).execute()
+    return d.data[0] if d.data else None
 
+def _login(authenticate):
+    # Il profilo si legge solo dopo l'autenticazione, come l'utente appena entrato
+    try: client = new_client()
+    except Exception as e: return None, None, None, str(e)
+    try: response = authenticate(client)
+    except Exception as e: return None, None, None, str(e)
+    user = response.user
+    if not user: return None, None, None, "Sessione non valida, accedi di nuovo."
+    try: row = _profile(client, user.id)
+    except Exception: row = None
+    return user, client, row, None
+
+def sign_in_async(email, password):
+    """Login non bloccante: Future che restituisce (user, client, profilo utenti_app, errore).
+
+    Il client è quello della sessione dell'utente (token compresi, vedi current_session).
+    """
+    def work():
+        with metrics.span("auth.sign_in_async"):
+            return _login(lambda c: c.auth.sign_in_with_password({"email": email, "password": password}))
+    return _pool().submit(work)
+
+def restore_async(refresh_token):
+    """Ripristina una sessione dal refresh token salvato nel browser, senza password.
+
+    Future che restituisce (user, client, profilo, errore) come sign_in_async;
+    la sessione del nuovo client contiene il refresh token da salvare al posto del vecchio.
+    """
+    def work():
+        with metrics.span("auth.restore"):
+            return _login(lambda c: c.auth.refresh_session(refresh_token))
+    return _pool().submit(work)
+
+@metrics.timed("auth.sign_up")
 def sign_up(email, password, username):
     """Registrazione con salvataggio metadati"""
     try:
         # 1. Crea utente nel sistema Auth (Gestione Password sicura)
-        auth_response = supabase.auth.sign_up({
+        client = new_client()  # una registrazione può aprire subito una sessione: mai sul client condiviso
+        auth_response = client.auth.sign_up({
             "email": email,
             "password": password,
             "options": {
@@ -51,20 +107,29 @@ def sign_up(email, password, username):
                 "auth_user_id": user_id, # Colleghiamo le due identità
                 "livello_xp": 1
             }
-            supabase.table("utenti_app").insert(data).execute()
+            client.table("utenti_app").insert(data).execute()
             
         return auth_response.user, None
     except Exception as e:
         return None, str(e)
 
+@metrics.timed("auth.reset_password_request")
 def reset_password_request(email):
     """Invia email per il reset password"""
     try:
-        supabase.auth.reset_password_email(email)
+        _client().auth.reset_password_email(email)
         return True, "Email di reset inviata! Controlla la posta."
     except Exception as e:
         return False, str(e)
 
-def logout():
-    """Chiude la sessione sicura"""
-    supabase.auth.sign_out()
\ No newline at end of file
+@metrics.timed("auth.logout")
+def logout(client):
+    """Chiude la sessione sicura: client è quello della sessione dell'utente.
+
+    Si revoca solo questa sessione (scope local), non quelle dell'utente su altri dispositivi.
+    """
+    if client is None: return
+    try:
+        try: client.auth.sign_out({"scope": "local"})
+        except TypeError: client.auth.sign_out()  # supabase-py senza scope: sessione del client
+    except Exception: pass
\ No newline at end of file
@@ -0,0 +1,74 @@
+import os
+import threading
+import pandas as pd
+from modules.ingest import cache_dir
+
+# pyarrow è opzionale: senza, ogni upload viene semplicemente riletto
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+MAX_CACHE_MB = float(os.getenv("DATAGYM_COLUMNAR_CACHE_MB", "1024"))
+
+_write_lock = threading.Lock()
+
+
+def _path(fingerprint):
+    return os.path.join(cache_dir("columnar"), f"{fingerprint}.arrow")
+
+
+def read_file(path):
+    # File Arrow IPC non compresso mappato in memoria: le colonne puntano
+    # direttamente alle pagine del file, condivise tra tutte le sessioni
+    source = pa.memory_map(path, "r")
+    table = pa.ipc.open_file(source).read_all()
+    # Le colonne category (compattate all'upload) restano category pandas
+    return table.to_pandas(types_mapper=lambda t: None if pa.types.is_dictionary(t) else pd.ArrowDtype(t))
+
+
+def write_file(df, path):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    tmp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def _evict():
+    folder = cache_dir("columnar")
+    files = []
+    for name in os.listdir(folder):
+        if not name.endswith(".arrow"): continue
+        st = os.stat(os.path.join(folder, name))
+        files.append((st.st_mtime, st.st_size, name))
+    total = sum(f[1] for f in files)
+    # I file meno usati di recente (mtime aggiornato a ogni lettura) escono per primi
+    for _, size, name in sorted(files)[:-1]:
+        if total <= MAX_CACHE_MB * 1024 * 1024: break
+        try: os.remove(os.path.join(folder, name))
+        except OSError: pass
+        total -= size
+
+
+def cached_read(fingerprint, parse):
+    """DataFrame di un upload: dalla cache colonnare se già visto, altrimenti parse()"""
+    if pa is None: return parse()
+    path = _path(fingerprint)
+    if os.path.exists(path):
+        try:
+            os.utime(path)
+            return read_file(path)
+        except Exception:
+            try: os.remove(path)
+            except OSError: pass
+    df = parse()
+    try:
+        with _write_lock:
+            write_file(df, path)
+            _evict()
+        return read_file(path)
+    except Exception:
+        # Colonne non convertibili in Arrow (es. tipi misti): si usa il DataFrame così com'è
+        return df
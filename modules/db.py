@@ -0,0 +1,69 @@
+import os
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+POOL_CONNECTIONS = int(os.getenv("DATAGYM_HTTP_POOL", "20"))
+KEEPALIVE_SECONDS = float(os.getenv("DATAGYM_HTTP_KEEPALIVE", "60"))
+TIMEOUT_SECONDS = float(os.getenv("DATAGYM_HTTP_TIMEOUT", "15"))
+
+_client = None
+_lock = threading.Lock()
+
+
+def _client_options():
+    try:
+        from supabase import ClientOptions
+    except ImportError:
+        from supabase.lib.client_options import ClientOptions
+    return ClientOptions
+
+
+def _options():
+    # Un solo pool httpx con connessioni keep-alive per le query anonime
+    ClientOptions = _client_options()
+    if "httpx_client" not in getattr(ClientOptions, "__dataclass_fields__", {}): return None
+    import httpx
+    http = httpx.Client(
+        timeout=TIMEOUT_SECONDS,
+        limits=httpx.Limits(max_connections=POOL_CONNECTIONS, max_keepalive_connections=POOL_CONNECTIONS, keepalive_expiry=KEEPALIVE_SECONDS),
+    )
+    return ClientOptions(httpx_client=http, postgrest_client_timeout=TIMEOUT_SECONDS)
+
+
+def get_client():
+    """Client Supabase unico del processo, creato alla prima richiesta (None se non configurato).
+
+    Serve solo per i dati letti con la chiave anonima (lezioni, classifica):
+    su questo client non si fa mai login, perché supabase-py riscrive l'header
+    Authorization del client a ogni login e lo vedrebbero tutte le sessioni.
+    """
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                url = os.getenv("SUPABASE_URL")
+                key = os.getenv("SUPABASE_KEY")
+                if not url or not key: return None
+                # supabase è un import pesante: si paga solo quando serve davvero
+                from supabase import create_client
+                options = _options()
+                _client = create_client(url, key, options) if options else create_client(url, key)
+    return _client
+
+
+def new_session_client():
+    """Client Supabase di una sola sessione utente: login, token e dati scritti a suo nome.
+
+    Niente rinnovo automatico dei token in background (li rinnova la sessione
+    stessa, che deve anche aggiornare il cookie) e nessuna persistenza su disco.
+    """
+    url = os.getenv("SUPABASE_URL")
+    key = os.getenv("SUPABASE_KEY")
+    if not url or not key: return None
+    from supabase import create_client
+    ClientOptions = _client_options()
+    fields = getattr(ClientOptions, "__dataclass_fields__", {})
+    options = {k: False for k in ("auto_refresh_token", "persist_session") if k in fields}
+    return create_client(url, key, ClientOptions(**options))
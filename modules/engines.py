@@ -0,0 +1,199 @@
+import os
+import re
+import time
+import threading
+import importlib.util
+import pandas as pd
+from collections import OrderedDict
+from modules import sql_exec, profiler
+from modules.memory import resolve
+from modules.query_cache import date_columns
+
+DEFAULT_ENGINE = os.getenv("DATAGYM_SQL_ENGINE", "sqlite")
+# Istruzioni che restano nella transazione annullata a fine query (niente COMMIT, SET, ATTACH, COPY...)
+_DUCKDB_ALLOWED = {"SELECT", "EXPLAIN", "CREATE", "INSERT", "UPDATE", "DELETE", "DROP", "ALTER", "MERGE_INTO", "ANALYZE"}
+_DUCKDB_READ_ONLY = {"SELECT", "EXPLAIN"}
+
+
+class SQLiteEngine:
+    """Motore di default: database SQLite condiviso per workspace (DatasetCache)"""
+    name = "sqlite"
+    label = "SQLite"
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def run(self, query, tables, fingerprint, row_cap=sql_exec.ROW_CAP, timeout=sql_exec.TIMEOUT_SECONDS, cancel=None, setup=(), stats=None):
+        with self.cache.connection(fingerprint, tables, setup) as conn:
+            if stats is None: return sql_exec.run_capped(conn, query, row_cap=row_cap, timeout=timeout, cancel=cancel)
+            # Profilo: piano prima dell'esecuzione (la query può creare tabelle), poi tempo e letture
+            stats.update(engine=self.name, plan=profiler.sqlite_plan(conn, query))
+            start = time.perf_counter()
+            df = sql_exec.run_capped(conn, query, row_cap=row_cap, timeout=timeout, cancel=cancel, stats=stats)
+            stats['ms'] = (time.perf_counter() - start) * 1000
+            stats['rows_scanned'] = profiler.sqlite_scanned(conn, query, stats['plan'])
+            return df
+
+
+# Errori DuckDB riscritti come quelli di SQLite, già noti agli studenti
+_DUCKDB_ERRORS = [
+    (re.compile(r'Table with name (\S+) does not exist'), r'no such table: \1'),
+    (re.compile(r'Referenced column "([^"]+)" not found'), r'no such column: \1'),
+    (re.compile(r'syntax error at or near "([^"]*)"'), r'near "\1": syntax error'),
+]
+
+
+def _duckdb_message(e):
+    msg = str(e).split("\n")[0]
+    for pattern, repl in _DUCKDB_ERRORS:
+        m = pattern.search(msg)
+        if m: return m.expand(repl)
+    return re.sub(r'^[A-Za-z ]+ Error: ', '', msg)
+
+
+def _register(conn, table_name, source):
+    # Le colonne compattate all'upload (int8/int16/int32, float32) vengono viste
+    # come BIGINT/DOUBLE: DuckDB dà errore di overflow sui tipi stretti (es. 100 * 100 in INT8)
+    casts = []
+    # Date e datetime tornano testo come in SQLite (AAAA-MM-GG, AAAA-MM-GG HH:MM:SS[.ffffff]):
+    # stessi risultati e stesse impronte per la correzione con entrambi i motori
+    dates = set(date_columns(source))
+    for col, dtype in source.dtypes.items():
+        if pd.api.types.is_datetime64_any_dtype(dtype):
+            if col in dates: casts.append(f'strftime("{col}", \'%Y-%m-%d\') AS "{col}"')
+            else: casts.append(f'CASE WHEN epoch_us("{col}") % 1000000 = 0 THEN strftime("{col}", \'%Y-%m-%d %H:%M:%S\') '
+                               f'ELSE strftime("{col}", \'%Y-%m-%d %H:%M:%S.%f\') END AS "{col}"')
+            continue
+        if pd.api.types.is_bool_dtype(dtype) or getattr(dtype, "itemsize", 8) >= 8: continue
+        if pd.api.types.is_integer_dtype(dtype): casts.append(f'CAST("{col}" AS BIGINT) AS "{col}"')
+        elif pd.api.types.is_float_dtype(dtype): casts.append(f'CAST("{col}" AS DOUBLE) AS "{col}"')
+    # Copia in una tabella vera: le viste registrate non si vedono dai cursori
+    conn.register(f"_raw_{table_name}", source)
+    select = f'SELECT * REPLACE ({", ".join(casts)})' if casts else "SELECT *"
+    conn.execute(f'CREATE TABLE "{table_name}" AS {select} FROM "_raw_{table_name}"')
+    conn.unregister(f"_raw_{table_name}")
+
+
+class _Database:
+    def __init__(self, conn, size):
+        self.conn = conn
+        self.size = size
+        self.write_lock = threading.Lock()  # due transazioni che scrivono andrebbero in conflitto
+
+
+class DuckDBEngine:
+    """Motore vettoriale: un database DuckDB in memoria per workspace.
+
+    Come per SQLite (DatasetCache) il database viene caricato una volta per
+    impronta del workspace e tenuto in una cache LRU con budget di memoria;
+    ogni query gira su un cursore dentro una transazione annullata alla fine,
+    quindi eventuali tabelle create dallo studente non restano. Le query di
+    sola lettura girano in parallelo, quelle che scrivono una alla volta.
+    Se il workspace contiene uno store su disco (import a blocchi, file
+    SQLite) la query passa al motore di riserva. Gli indici (`setup`) non
+    servono a DuckDB. Con `stats` la query gira con il profiling di DuckDB
+    (righe lette esatte).
+    """
+    name = "duckdb"
+    label = "DuckDB"
+
+    def __init__(self, fallback, budget_mb=None):
+        if budget_mb is None:
+            budget_mb = float(os.getenv("DATAGYM_DUCKDB_CACHE_MB", "256"))
+        self.fallback = fallback
+        self.budget = int(budget_mb * 1024 * 1024)
+        self._databases = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def total_size(self):
+        with self._lock:
+            return sum(d.size for d in self._databases.values())
+
+    def _database(self, fingerprint, tables):
+        with self._lock:
+            db = self._databases.get(fingerprint)
+            if db is not None:
+                self._databases.move_to_end(fingerprint)
+                return db
+        import duckdb
+        # Niente accesso a file e rete: il database è condiviso tra le sessioni
+        conn = duckdb.connect(config={"enable_external_access": False})
+        for table_name, source in tables.items(): _register(conn, table_name, resolve(source))
+        size = conn.execute("SELECT sum(memory_usage_bytes) FROM duckdb_memory()").fetchone()[0] or 0
+        with self._lock:
+            db = self._databases.setdefault(fingerprint, _Database(conn, size))
+            self._databases.move_to_end(fingerprint)
+            total = sum(d.size for d in self._databases.values())
+            # L'ultimo inserito resta sempre; nessun close: una query in corso potrebbe usarlo
+            while total > self.budget and len(self._databases) > 1:
+                _, old = self._databases.popitem(last=False)
+                total -= old.size
+        return db
+
+    def invalidate(self, fingerprint):
+        """Rimuove dalla cache il database di un workspace"""
+        if not fingerprint: return
+        with self._lock:
+            self._databases.pop(fingerprint, None)
+
+    def run(self, query, tables, fingerprint, row_cap=sql_exec.ROW_CAP, timeout=sql_exec.TIMEOUT_SECONDS, cancel=None, setup=(), stats=None):
+        if any(isinstance(source, str) for source in tables.values()):
+            return self.fallback.run(query, tables, fingerprint, row_cap, timeout, cancel, setup, stats)
+        import duckdb
+        try:
+            kinds = {s.type.name for s in duckdb.extract_statements(query)}
+            db = self._database(fingerprint, tables)
+        except duckdb.Error as e: raise sql_exec.QueryError(_duckdb_message(e)) from None
+        denied = sorted(kinds - _DUCKDB_ALLOWED)
+        if denied: raise sql_exec.QueryError(f"Istruzione non consentita: {denied[0]}")
+        lock = None if kinds <= _DUCKDB_READ_ONLY else db.write_lock
+        if lock is not None: lock.acquire()
+        conn = db.conn.cursor()
+        done = threading.Event(); reason = []
+
+        def watchdog():
+            deadline = time.monotonic() + timeout
+            while not done.wait(0.05):
+                if cancel is not None and cancel.is_set(): reason.append("cancel")
+                elif time.monotonic() > deadline: reason.append("timeout")
+                else: continue
+                conn.interrupt(); return
+
+        threading.Thread(target=watchdog, daemon=True).start()
+        try:
+            conn.begin()
+            if stats is not None:
+                stats['engine'] = self.name
+                conn.execute("PRAGMA enable_profiling='no_output'")
+                start = time.perf_counter()
+            cur = conn.execute(query)
+            if cur.description is None:
+                df, truncated = pd.DataFrame(), False
+            else:
+                rows = cur.fetchmany(row_cap + 1)
+                truncated = len(rows) > row_cap
+                df = pd.DataFrame.from_records(rows[:row_cap], columns=[d[0] for d in cur.description], coerce_float=True)
+            if stats is not None:
+                stats['ms'] = (time.perf_counter() - start) * 1000
+                profiler.duckdb_stats(conn, query, not truncated, stats)
+        except duckdb.Error as e:
+            if "cancel" in reason: raise sql_exec.QueryInterrupted("Query annullata.")
+            if "timeout" in reason: raise sql_exec.QueryInterrupted(f"Query interrotta: superato il limite di {timeout:g} secondi.")
+            raise sql_exec.QueryError(_duckdb_message(e)) from None
+        finally:
+            done.set()
+            try: conn.rollback()
+            except duckdb.Error: pass  # transazione già chiusa da un errore
+            conn.close()
+            if lock is not None: lock.release()
+        df.attrs['truncated'] = truncated
+        return df
+
+
+def available_engines(cache):
+    """Motori disponibili in questo deployment, per nome"""
+    engines = {"sqlite": SQLiteEngine(cache)}
+    # DuckDB è opzionale (e viene importato solo alla prima query)
+    if importlib.util.find_spec("duckdb") is not None: engines["duckdb"] = DuckDBEngine(engines["sqlite"])
+    return engines
@@ -0,0 +1,108 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+import numpy as np
+import pandas as pd
+
+# Oltre questo numero di righe la soluzione di riferimento non viene valutata
+REFERENCE_ROW_CAP = int(os.getenv("DATAGYM_GRADING_ROW_CAP", "100000"))
+CACHE_ENTRIES = int(os.getenv("DATAGYM_GRADING_CACHE_ENTRIES", "2048"))
+# Cifre decimali considerate: 0.1 + 0.2 e 0.3 sono lo stesso risultato
+FLOAT_DIGITS = 6
+
+# Due chiavi indipendenti (16 caratteri, come richiesto da hash_array)
+_KEYS = ("datagym-grade-01", "datagym-grade-02")
+
+ResultFingerprint = namedtuple("ResultFingerprint", "rows cols h1 h2")
+
+
+def _normalize(df):
+    # Colonne per posizione (gli alias non contano), numeri come float
+    # arrotondati (3 e 3.0 coincidono, +0.0 assorbe -0.0), tutto il resto come
+    # testo: fattorizzato, perché l'hash si calcola solo sui valori distinti
+    cols = []
+    for _, s in df.items():
+        if pd.api.types.is_bool_dtype(s) or pd.api.types.is_numeric_dtype(s):
+            values = pd.to_numeric(s, errors="coerce").astype("float64").round(FLOAT_DIGITS).to_numpy() + 0.0
+            values[np.isnan(values)] = np.nan  # un solo NaN
+            cols.append(("num", values.view(np.uint64)))
+        else:
+            codes, uniques = pd.factorize(s.astype("string"))
+            cols.append(("text", codes, np.asarray(uniques, dtype=object)))
+    return cols
+
+
+def _row_hashes(cols, key):
+    # hash_pandas_object ignora hash_key sui numeri: la chiave entra nei valori
+    # (XOR con un sale per i numeri, hash con chiave per il testo)
+    salt = np.uint64(int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little"))
+    frame = {}
+    for i, col in enumerate(cols):
+        if col[0] == "num": frame[i] = col[1] ^ salt
+        else:
+            _, codes, uniques = col
+            hashed = pd.util.hash_array(uniques, hash_key=key)
+            frame[i] = np.where(codes < 0, salt, hashed[codes] if len(hashed) else salt)
+    return pd.util.hash_pandas_object(pd.DataFrame(frame), index=False)
+
+
+def result_fingerprint(df):
+    """Impronta compatta di un risultato, indipendente dall'ordine delle righe.
+
+    Ogni riga ha un hash a 64 bit (vettoriale, hash_pandas_object); le somme
+    modulo 2^64 con due chiavi diverse, più il numero di righe e colonne,
+    identificano il multiinsieme delle righe.
+    """
+    if df.shape[1] == 0: return ResultFingerprint(len(df), 0, 0, 0)
+    cols = _normalize(df)
+    sums = [int(_row_hashes(cols, k).to_numpy().sum(dtype=np.uint64)) for k in _KEYS]
+    return ResultFingerprint(len(df), df.shape[1], *sums)
+
+
+class ReferenceCache:
+    """Impronte delle soluzioni di riferimento, condivise da tutte le sessioni.
+
+    La chiave è (lezione, fingerprint del dataset, motore): la soluzione gira
+    una sola volta per dataset, poi ogni RUN confronta solo due impronte.
+    None significa "soluzione non valutabile su questo dataset" e viene
+    anch'esso memorizzato per non ripetere una query che fallisce.
+    """
+
+    def __init__(self, max_entries=CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._computing = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, compute):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            key_lock = self._computing.setdefault(key, threading.Lock())
+        # Più sessioni sullo stesso esercizio: la soluzione gira una volta sola
+        with key_lock:
+            with self._lock:
+                if key in self._entries: return self._entries[key]
+            try:
+                value = compute()
+            except BaseException:
+                with self._lock: self._computing.pop(key, None)
+                raise
+            with self._lock:
+                self._entries[key] = value
+                self._computing.pop(key, None)
+                while len(self._entries) > self.max_entries: self._entries.popitem(last=False)
+            return value
+
+    def invalidate(self, fingerprint):
+        """Rimuove le impronte calcolate su un dataset"""
+        if not fingerprint: return
+        with self._lock:
+            for key in [k for k in self._entries if k[1] == fingerprint]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,113 @@
+import os
+import re
+import sqlite3
+from collections import namedtuple
+
+# create: crea gli indici utili | suggest: li mostra soltanto | off
+MODE = os.getenv("DATAGYM_AUTO_INDEX", "create")
+# Sotto questa soglia una scansione completa costa meno di un indice
+MIN_ROWS = int(os.getenv("DATAGYM_INDEX_MIN_ROWS", "10000"))
+
+_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)')
+_AUTOMATIC = re.compile(r'^SEARCH (?:TABLE )?(\w+) USING AUTOMATIC (?:PARTIAL )?(?:COVERING )?INDEX \((\w+)')
+_SOURCE = re.compile(r'\b(?:FROM|JOIN)\s+"?(\w+)"?(?:\s+(?:AS\s+)?"?(\w+)"?)?', re.IGNORECASE)
+_COMPARE = r'(?:=|==|!=|<>|<=|>=|<|>|\bIN\b|\bBETWEEN\b|\bLIKE\b|\bGLOB\b|\bIS\b)'
+_LEFT = re.compile(r'(?:"?(\w+)"?\.)?"?(\w+)"?\s*' + _COMPARE, re.IGNORECASE)
+_RIGHT = re.compile(r'(?:=|==|<=|>=|<|>)\s*(?:"?(\w+)"?\.)?"?(\w+)"?', re.IGNORECASE)
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_KEYWORDS = {"where", "on", "join", "left", "right", "inner", "outer", "cross", "natural", "full", "group", "order",
+             "limit", "union", "except", "intersect", "using", "having", "window", "as", "set", "values"}
+
+
+class Suggestion(namedtuple("Suggestion", "schema table column")):
+    @property
+    def name(self):
+        return re.sub(r'\W', '_', f"dg_{self.table}_{self.column}")
+
+    @property
+    def sql(self):
+        return f'CREATE INDEX IF NOT EXISTS "{self.schema}"."{self.name}" ON "{self.table}"("{self.column}")'
+
+
+def _plan(conn, query):
+    try: return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + query)]
+    except sqlite3.Error: return []
+
+
+def aliases(query):
+    out = {}
+    for table, alias in _SOURCE.findall(query):
+        out[table] = table
+        if alias and alias.lower() not in _KEYWORDS: out[alias] = table
+    return out
+
+
+def _compared_columns(query):
+    # Colonne confrontate in filtri e join, come (qualificatore o "", colonna)
+    text = _STRING.sub("''", query)
+    return set(_LEFT.findall(text)) | set(_RIGHT.findall(text))
+
+
+def schema_of(conn, table):
+    for _, schema, _ in conn.execute("PRAGMA database_list"):
+        if conn.execute(f'SELECT 1 FROM "{schema}".sqlite_master WHERE type = \'table\' AND name = ?', (table,)).fetchone():
+            return schema
+    return None
+
+
+def _indexed(conn, schema, table, column):
+    for row in conn.execute(f'PRAGMA "{schema}".index_list("{table}")'):
+        first = conn.execute(f'PRAGMA "{schema}".index_info("{row[1]}")').fetchone()
+        if first and first[2] == column: return True
+    return False
+
+
+def table_rows(conn, schema, table):
+    # Stima in O(log n): le tabelle importate hanno rowid progressivi
+    try: return conn.execute(f'SELECT MAX(rowid) FROM "{schema}"."{table}"').fetchone()[0] or 0
+    except sqlite3.Error: return 0
+
+
+def suggest(conn, query):
+    """Indici che eviterebbero le scansioni complete viste in EXPLAIN QUERY PLAN.
+
+    Una SCAN su una tabella è candidata per le colonne che la query confronta
+    (WHERE, ON, IN...); un AUTOMATIC INDEX indica già la colonna di join che
+    SQLite indicizza da capo a ogni esecuzione.
+    """
+    names = aliases(query)
+    compared = _compared_columns(query)
+    wanted = []
+    for detail in _plan(conn, query):
+        m = _AUTOMATIC.match(detail)
+        if m:
+            wanted.append((names.get(m.group(1), m.group(1)), {m.group(2)}))
+            continue
+        m = _SCAN.match(detail)
+        if not m or "USING" in detail: continue
+        alias = m.group(1); table = names.get(alias, alias)
+        wanted.append((table, {col for qual, col in compared if qual in ("", alias, table)}))
+
+    out = []
+    for table, columns in wanted:
+        schema = schema_of(conn, table)
+        if schema is None or table_rows(conn, schema, table) < MIN_ROWS: continue
+        existing = {r[1] for r in conn.execute(f'PRAGMA "{schema}".table_info("{table}")')}
+        for column in sorted(columns & existing):
+            s = Suggestion(schema, table, column)
+            if s not in out and not _indexed(conn, schema, table, column): out.append(s)
+    return out
+
+
+def apply(conn, query, suggestions):
+    """Crea gli indici suggeriti e tiene solo quelli che il planner usa davvero.
+
+    `conn` deve essere fuori dalla transazione di protezione (DatasetCache.writable).
+    """
+    created = []
+    for s in suggestions:
+        try: conn.execute(s.sql)
+        except sqlite3.OperationalError: continue  # store su disco bloccato o in sola lettura
+        if any(s.name in detail for detail in _plan(conn, query)): created.append(s)
+        else: conn.execute(f'DROP INDEX IF EXISTS "{s.schema}"."{s.name}"')
+    return created
@@ -0,0 +1,234 @@
+import os
+import re
+import uuid
+import sqlite3
+import zipfile
+import weakref
+import tempfile
+import threading
+import importlib.util
+import xml.etree.ElementTree as ET
+import pandas as pd
+
+# Cartella condivisa tra le sessioni per i dati derivati dagli upload
+CACHE_DIR = os.getenv("DATAGYM_CACHE_DIR", os.path.join(tempfile.gettempdir(), "datagym"))
+
+STREAMING_MODE = os.getenv("DATAGYM_STREAMING_INGEST", "auto")  # auto | on | off
+STREAMING_THRESHOLD_MB = float(os.getenv("DATAGYM_STREAMING_THRESHOLD_MB", "20"))
+MAX_UPLOAD_MB = float(os.getenv("DATAGYM_MAX_UPLOAD_MB", "200"))
+MAX_UPLOAD_ROWS = int(os.getenv("DATAGYM_MAX_UPLOAD_ROWS", "2000000"))
+MAX_TABLES = int(os.getenv("DATAGYM_WORKSPACE_TABLES", "8"))
+CHUNK_ROWS = int(os.getenv("DATAGYM_INGEST_CHUNK_ROWS", "50000"))
+SAMPLE_ROWS = 1000
+PREVIEW_ROWS = 5
+# calamine (python-calamine, opzionale) legge gli .xlsx molto più in fretta di openpyxl
+EXCEL_ENGINE = os.getenv("DATAGYM_EXCEL_ENGINE") or ("calamine" if importlib.util.find_spec("python_calamine") else "openpyxl")
+# Testi con al massimo questa quota di valori distinti diventano category
+CATEGORY_RATIO = float(os.getenv("DATAGYM_CATEGORY_RATIO", "0.5"))
+
+_ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+def cache_dir(name):
+    path = os.path.join(CACHE_DIR, name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def use_streaming(size_bytes):
+    """Decide se un upload va importato a blocchi nello store su disco"""
+    if STREAMING_MODE == "on": return True
+    if STREAMING_MODE == "off": return False
+    return size_bytes > STREAMING_THRESHOLD_MB * 1024 * 1024
+
+
+def check_size(size_bytes):
+    if size_bytes > MAX_UPLOAD_MB * 1024 * 1024:
+        raise ValueError(f"File troppo grande ({size_bytes / 1024 / 1024:.0f} MB, massimo {MAX_UPLOAD_MB:.0f} MB)")
+
+
+def infer_dtypes(sample):
+    """Tipi delle colonne stimati su un campione, riusati per tutti i blocchi"""
+    dtypes = {}
+    for col, dtype in sample.dtypes.items():
+        if pd.api.types.is_bool_dtype(dtype): dtypes[col] = "boolean"
+        elif pd.api.types.is_integer_dtype(dtype): dtypes[col] = "Int64"
+        elif pd.api.types.is_float_dtype(dtype): dtypes[col] = "float64"
+        else: dtypes[col] = "object"
+    return dtypes
+
+
+def _iso_dates(s):
+    # Solo colonne in cui ogni valore è una data AAAA-MM-GG: nessuna ambiguità giorno/mese
+    values = s.dropna()
+    if not len(values) or not values.head(SAMPLE_ROWS).astype(str).map(lambda v: bool(_ISO_DATE.match(v))).all(): return None
+    dates = pd.to_datetime(s, format="%Y-%m-%d", errors="coerce")
+    return dates if dates.notna().sum() == len(values) else None
+
+
+def compact_dtypes(df):
+    """Stessi valori, meno memoria: tipi compatti per un DataFrame caricato.
+
+    Interi e float ridotti alla larghezza minima senza perdita, date ISO
+    (AAAA-MM-GG) come datetime64, testi con pochi valori distinti come category.
+    """
+    cols = {}
+    for col, s in df.items():
+        if pd.api.types.is_bool_dtype(s): pass
+        elif pd.api.types.is_integer_dtype(s): s = pd.to_numeric(s, downcast="integer")
+        elif pd.api.types.is_float_dtype(s):
+            small = s.astype("float32")
+            if small.astype("float64").equals(s.astype("float64")): s = small
+        elif pd.api.types.is_object_dtype(s) or pd.api.types.is_string_dtype(s):
+            dates = _iso_dates(s)
+            if dates is not None: s = dates
+            elif s.nunique() <= len(s) * CATEGORY_RATIO: s = s.astype("category")
+        cols[col] = s
+    return pd.DataFrame(cols, index=df.index)
+
+
+def _csv_chunks(file, size_bytes):
+    file.seek(0)
+    sample = pd.read_csv(file, nrows=SAMPLE_ROWS)
+    dtypes = infer_dtypes(sample)
+    # Avanzamento stimato dai byte medi per riga (il parser C legge il buffer in blocco)
+    file.seek(0)
+    head = file.read(64 * 1024)
+    row_bytes = len(head) / max(head.count(b"\n"), 1)
+    frac = lambda n: n * row_bytes / max(size_bytes, 1)
+    file.seek(0)
+    done = 0
+    try:
+        for chunk in pd.read_csv(file, dtype=dtypes, chunksize=CHUNK_ROWS):
+            done += len(chunk)
+            yield chunk, frac(done)
+    except (ValueError, TypeError):
+        # Il campione non era rappresentativo: si riparte lasciando a pandas i tipi
+        file.seek(0)
+        yield None, 0.0
+        done = 0
+        for chunk in pd.read_csv(file, chunksize=CHUNK_ROWS):
+            done += len(chunk)
+            yield chunk, frac(done)
+
+
+_XLSX_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+
+
+def excel_sheets(file):
+    """Nomi dei fogli di un .xlsx letti da xl/workbook.xml, senza aprire i fogli"""
+    file.seek(0)
+    try:
+        with zipfile.ZipFile(file) as z: root = ET.fromstring(z.read("xl/workbook.xml"))
+    except (zipfile.BadZipFile, KeyError, ET.ParseError):
+        return []
+    finally:
+        file.seek(0)
+    return [s.get("name") for s in root.iter(f"{_XLSX_NS}sheet") if s.get("state", "visible") == "visible"]
+
+
+def read_excel_sheet(file, sheet=None):
+    """Un foglio intero in un DataFrame (il primo visibile se sheet è None)"""
+    if sheet is None: sheet = next(iter(excel_sheets(file)), 0)
+    file.seek(0)
+    return pd.read_excel(file, sheet_name=sheet, engine=EXCEL_ENGINE)
+
+
+def _excel_chunks(file, sheet=None):
+    # openpyxl in sola lettura scorre le righe senza caricare tutto il foglio
+    # (calamine è più veloce ma tiene in memoria il foglio intero)
+    from openpyxl import load_workbook
+    file.seek(0)
+    wb = load_workbook(file, read_only=True, data_only=True)
+    try:
+        ws = next((w for w in wb.worksheets if w.sheet_state == "visible"), wb.worksheets[0]) if sheet is None else wb[sheet]
+        total = ws.max_row or 0
+        rows = ws.iter_rows(values_only=True)
+        header = [str(h) if h is not None else f"col_{i}" for i, h in enumerate(next(rows, ()))]
+        buf, done = [], 0
+        for row in rows:
+            buf.append(row)
+            if len(buf) >= CHUNK_ROWS:
+                done += len(buf)
+                yield pd.DataFrame(buf, columns=header), done / total if total else 0.0
+                buf = []
+        if buf: yield pd.DataFrame(buf, columns=header), 1.0
+    finally:
+        wb.close()
+
+
+def stream_to_store(file, name, table_name, fingerprint, progress=None, sheet=None):
+    """Importa CSV/XLSX a blocchi in un database SQLite su disco.
+
+    Per gli .xlsx `sheet` sceglie il foglio (default: il primo visibile).
+
+    Lo store è indirizzato per contenuto: lo stesso file caricato di nuovo,
+    anche da un'altra sessione, riusa il database già costruito. In memoria
+    resta solo un piccolo campione per l'anteprima.
+    Ritorna un dict con path, preview, rows e truncated.
+    """
+    size_bytes = getattr(file, "size", None) or len(file.getvalue())
+    check_size(size_bytes)
+    path = os.path.join(cache_dir("stores"), f"{fingerprint}_{table_name}.sqlite")
+    if os.path.exists(path):
+        conn = sqlite3.connect(path)
+        try:
+            preview = pd.read_sql_query(f'SELECT * FROM "{table_name}" LIMIT {PREVIEW_ROWS}', conn)
+            rows = conn.execute(f'SELECT COUNT(*) FROM "{table_name}"').fetchone()[0]
+        finally: conn.close()
+        if progress: progress(1.0, rows)
+        return {"path": path, "preview": preview, "rows": rows, "truncated": rows >= MAX_UPLOAD_ROWS}
+
+    chunks = _csv_chunks(file, size_bytes) if name.endswith(".csv") else _excel_chunks(file, sheet)
+    tmp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    conn = sqlite3.connect(tmp_path)
+    rows, preview, truncated = 0, None, False
+    try:
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        for chunk, frac in chunks:
+            if chunk is None:
+                # Ripartenza senza tipi forzati: si scarta quanto scritto finora
+                conn.execute(f'DROP TABLE IF EXISTS "{table_name}"'); rows = 0; preview = None
+                continue
+            if rows + len(chunk) > MAX_UPLOAD_ROWS:
+                chunk = chunk.iloc[:MAX_UPLOAD_ROWS - rows]; truncated = True
+            chunk.to_sql(table_name, conn, index=False, if_exists="append")
+            if preview is None: preview = chunk.head(PREVIEW_ROWS).copy()
+            rows += len(chunk)
+            if progress: progress(min(frac, 1.0), rows)
+            if truncated: break
+        conn.commit()
+    except Exception:
+        conn.close(); os.remove(tmp_path)
+        raise
+    conn.close()
+    os.replace(tmp_path, path)
+    if preview is None: preview = pd.DataFrame()
+    if progress: progress(1.0, rows)
+    return {"path": path, "preview": preview, "rows": rows, "truncated": truncated}
+
+
+class PrivateStore(str):
+    """Path della copia di uno store riservata a una sessione (vedi private_store)"""
+
+
+def _discard(path):
+    try: os.remove(path)
+    except OSError: pass
+
+
+def private_store(path, session_id):
+    """Copia di uno store condiviso in cui una sessione può creare indici.
+
+    Lo store originale è indirizzato per contenuto e lo leggono tutte le
+    sessioni con lo stesso file: non va mai modificato. La copia si cancella
+    da sola quando la sessione non la usa più (tabella rimossa o sessione scaduta).
+    """
+    if isinstance(path, PrivateStore): return path
+    copy = PrivateStore(os.path.join(cache_dir("private"), f"{session_id}_{uuid.uuid4().hex[:8]}_{os.path.basename(path)}"))
+    src, dst = sqlite3.connect(path), sqlite3.connect(copy)
+    try: src.backup(dst)
+    finally: src.close(); dst.close()
+    weakref.finalize(copy, _discard, str(copy))
+    return copy
@@ -0,0 +1,126 @@
+import os
+import time
+import hashlib
+import threading
+
+TTL_SECONDS = float(os.getenv("DATAGYM_LEADERBOARD_TTL", "300"))
+TOP_N = int(os.getenv("DATAGYM_LEADERBOARD_SIZE", "10"))
+
+# Colonne XP per traccia (supabase/migrations/..._classifica.sql)
+TRACK_COLUMNS = {"SQL": "xp_sql", "PYTHON": "xp_python"}
+# Vista senza email né id utente; se manca si legge direttamente la tabella.
+# Per ogni sorgente la colonna che identifica l'utente
+SOURCES = {"classifica": "chiave_utente", "utenti_app": "auth_user_id"}
+
+
+def user_key(user_id):
+    """Chiave anonima di un utente in classifica: md5 dell'id, come nella vista classifica"""
+    return hashlib.md5(str(user_id).encode()).hexdigest()
+
+
+def _copy(rows):
+    # record() modifica le righe in memoria: chi legge riceve una copia
+    return [dict(r) for r in rows]
+
+
+class Leaderboard:
+    """Classifiche top-N (globale e per traccia) condivise dal processo.
+
+    Ogni classifica è una sola query ORDER BY ... LIMIT eseguita sul server,
+    tenuta in memoria per il TTL: le pagine viste non interrogano il database.
+    Gli XP salvati dall'XPWriter aggiornano le classifiche in memoria (record)
+    senza rileggerle; gli aggiornamenti di altri processi arrivano al TTL.
+    Le righe identificano l'utente con user_key(), mai con il suo id.
+    """
+
+    def __init__(self, get_client, ttl=TTL_SECONDS, size=TOP_N):
+        # get_client: funzione che ritorna il client Supabase (creato in modo pigro)
+        self.get_client = get_client
+        self.ttl = ttl
+        self.size = size
+        self._boards = {}  # colonna -> [caricata alle, righe ordinate]
+        self._names = {}   # user_key -> username, per chi entra in classifica
+        self._source = None
+        self._columns = None
+        self._detected_at = 0.0
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+
+    def start(self):
+        """Rileva sorgente e colonne in background, all'avvio: nessuna sessione aspetta"""
+        threading.Thread(target=self._detect_locked, daemon=True).start()
+
+    def _detect_locked(self):
+        with self._fetch_lock: self._detect()
+
+    def _detect(self):
+        # Quale sorgente esiste e se ha già le colonne per traccia (se fallisce si ritenta dopo il TTL)
+        if self._source is not None or time.time() - self._detected_at < self.ttl: return
+        self._detected_at = time.time()
+        client = self.get_client()
+        if not client: return
+        for source, key in SOURCES.items():
+            base = [key, "username", "xp"]
+            for columns in (base + list(TRACK_COLUMNS.values()), base):
+                try: client.table(source).select(",".join(columns)).limit(1).execute()
+                except Exception: continue
+                self._source, self._columns = source, columns
+                return
+
+    @property
+    def supports_tracks(self):
+        """True se il database ha le colonne XP per traccia (xp_sql, xp_python).
+
+        Non interroga mai il database: finché il rilevamento di start() non è
+        concluso vale False (gli XP sono assoluti, il salvataggio successivo recupera).
+        """
+        return bool(self._columns) and TRACK_COLUMNS["SQL"] in self._columns
+
+    def _fetch(self, column):
+        response = (self.get_client().table(self._source).select(",".join(self._columns))
+                    .order(column, desc=True).limit(self.size).execute())
+        rows = [r for r in response.data if r.get(column)]
+        # Letta la tabella (vista assente): l'id non esce da qui
+        for r in rows:
+            if "auth_user_id" in r: r["chiave_utente"] = user_key(r.pop("auth_user_id"))
+        return rows
+
+    def get(self, track=None):
+        """Righe della classifica (globale se track è None); None se la traccia non è disponibile"""
+        column = "xp" if track is None else TRACK_COLUMNS[track]
+        with self._lock:
+            board = self._boards.get(column)
+            if board and time.time() - board[0] < self.ttl: return _copy(board[1])
+        # Una sola sessione alla volta ricarica; le altre trovano la classifica già pronta
+        with self._fetch_lock:
+            with self._lock:
+                board = self._boards.get(column)
+                if board and time.time() - board[0] < self.ttl: return _copy(board[1])
+            self._detect()
+            if not self._columns or column not in self._columns: return None if track else []
+            try: rows = self._fetch(column)
+            except Exception:
+                return _copy(board[1]) if board else []  # si serve la classifica scaduta
+            with self._lock:
+                self._boards[column] = [time.time(), rows]
+                for r in rows: self._names.setdefault(r.get("chiave_utente"), r.get("username"))
+            return _copy(rows)
+
+    def remember(self, user_id, username):
+        with self._lock: self._names[user_key(user_id)] = username
+
+    def record(self, user_id, values):
+        """Nuovi XP (valori assoluti) di un utente appena salvati: aggiorna le classifiche in memoria"""
+        key = user_key(user_id)
+        with self._lock:
+            for column, (loaded_at, rows) in self._boards.items():
+                if column not in values: continue
+                row = next((r for r in rows if r.get("chiave_utente") == key), None)
+                if row is None:
+                    # Fuori classifica: entra solo se supera l'ultimo di una classifica piena
+                    if len(rows) >= self.size and values[column] <= rows[-1].get(column, 0): continue
+                    row = {"chiave_utente": key, "username": self._names.get(key)}
+                    rows.append(row)
+                row.update({k: v for k, v in values.items() if k in ("xp", *TRACK_COLUMNS.values())})
+                rows.sort(key=lambda r: r.get(column) or 0, reverse=True)
+                del rows[self.size:]
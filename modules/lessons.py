@@ -0,0 +1,102 @@
+import os
+import json
+import time
+import threading
+from modules.ingest import cache_dir
+
+TTL_SECONDS = float(os.getenv("DATAGYM_LESSONS_TTL", "600"))
+# Avvio senza snapshot: attesa massima della rete prima di servire un catalogo vuoto
+FIRST_LOAD_WAIT = float(os.getenv("DATAGYM_LESSONS_WAIT", "5"))
+# Rete assente: fra quanto si ritenta (intanto si serve il catalogo che c'è)
+RETRY_SECONDS = 30
+
+
+class LessonCatalog:
+    """Catalogo lezioni condiviso dal processo, caricato con una sola query.
+
+    Tutte le tracce e i livelli vengono letti in blocco e serviti dalla
+    memoria. All'avvio si parte dallo snapshot locale, se c'è, mentre un
+    thread legge il catalogo da Supabase; scaduto il TTL (o dopo invalidate)
+    si continua a servire il catalogo vecchio finché arriva il nuovo.
+    """
+
+    def __init__(self, get_client, ttl=TTL_SECONDS, snapshot_path=None):
+        # get_client: funzione che ritorna il client Supabase (creato in modo pigro)
+        self.get_client = get_client
+        self.ttl = ttl
+        self.snapshot_path = snapshot_path or os.path.join(cache_dir("lessons"), "lezioni.json")
+        self._by_key = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._ready = threading.Event()  # primo caricamento concluso (rete o snapshot)
+
+    def _fetch(self):
+        response = self.get_client().table("lezioni").select("*").order("codice_lezione").execute()
+        return response.data
+
+    def _index(self, rows):
+        by_key = {}
+        for r in rows:
+            by_key.setdefault((r['track'], r['livello']), {})[f"{r['codice_lezione']} - {r['titolo']}"] = r
+        return by_key
+
+    def _save_snapshot(self, rows):
+        tmp_path = f"{self.snapshot_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f: json.dump(rows, f, ensure_ascii=False)
+        os.replace(tmp_path, self.snapshot_path)
+
+    def _load_snapshot(self):
+        try:
+            with open(self.snapshot_path, encoding="utf-8") as f: return json.load(f)
+        except (OSError, ValueError): return None
+
+    def refresh(self):
+        """Ricarica tutto il catalogo; in caso di errore resta quello attuale"""
+        try:
+            if not self.get_client(): raise RuntimeError("Supabase non configurato")
+            rows = self._fetch()
+            try: self._save_snapshot(rows)
+            except OSError: pass
+        except Exception:
+            rows = None
+        with self._lock:
+            self._refreshing = False
+            if rows is not None:
+                self._by_key = self._index(rows); self._loaded_at = time.time()
+            else:
+                if self._by_key is None:
+                    snap = self._load_snapshot()
+                    self._by_key = self._index(snap) if snap else {}
+                self._loaded_at = time.time() - self.ttl + min(self.ttl, RETRY_SECONDS)
+        self._ready.set()
+        return rows is not None
+
+    def prefetch(self):
+        """Avvio: catalogo dallo snapshot su disco (se c'è) e aggiornamento dalla rete in background"""
+        snap = self._load_snapshot()
+        if snap:
+            with self._lock:
+                # Già scaduto: serve subito, il refresh appena avviato lo sostituisce
+                if self._by_key is None: self._by_key = self._index(snap); self._loaded_at = 0.0
+            self._ready.set()
+        self._refresh_in_background()
+
+    def invalidate(self):
+        """Ricarica il catalogo (es. lezioni modificate su Supabase) senza aspettare il TTL"""
+        with self._lock: self._loaded_at = 0.0
+        self._refresh_in_background()
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing: return
+            self._refreshing = True
+        threading.Thread(target=self.refresh, daemon=True).start()
+
+    def get(self, track, difficulty):
+        if self._by_key is None:
+            # Primo render senza snapshot: si aspetta il prefetch già avviato, non oltre FIRST_LOAD_WAIT
+            self._refresh_in_background()
+            if not self._ready.wait(FIRST_LOAD_WAIT): return {}
+        elif time.time() - self._loaded_at > self.ttl: self._refresh_in_background()
+        return self._by_key.get((track, difficulty), {})
@@ -0,0 +1,142 @@
+import os
+import time
+import uuid
+import weakref
+import threading
+import pandas as pd
+from modules import columnar_cache
+from modules.ingest import cache_dir
+
+# RAM complessiva per i DataFrame delle sessioni, oltre si scarica su disco
+BUDGET_MB = float(os.getenv("DATAGYM_SESSION_MEMORY_MB", "1024"))
+# Solo i dataset non usati da almeno questo tempo possono essere scaricati
+IDLE_SECONDS = float(os.getenv("DATAGYM_SPILL_IDLE_SECONDS", "120"))
+
+
+def frame_bytes(df):
+    """Byte occupati in RAM; le colonne Arrow mappate dalla cache colonnare non contano"""
+    usage = df.memory_usage(deep=True, index=False)
+    return int(sum(n for col, n in usage.items() if not isinstance(df[col].dtype, pd.ArrowDtype)))
+
+
+def _remove(path):
+    try: os.remove(path)
+    except OSError: pass
+
+
+def _dump(df):
+    # Arrow IPC se disponibile: alla ricarica le colonne tornano mappate da file, non in RAM
+    base = os.path.join(cache_dir("spill"), uuid.uuid4().hex)
+    if columnar_cache.pa is not None:
+        try:
+            columnar_cache.write_file(df, base + ".arrow")
+            return base + ".arrow"
+        except Exception: pass  # tipi misti non convertibili: pickle
+    df.to_pickle(base + ".pkl")
+    return base + ".pkl"
+
+
+def _load(path):
+    return columnar_cache.read_file(path) if path.endswith(".arrow") else pd.read_pickle(path)
+
+
+class SessionDataset:
+    """DataFrame di una sessione che l'accountant può scaricare su disco.
+
+    get() lo restituisce sempre, ricaricandolo se era stato scaricato. Il
+    file su disco viene scritto una volta sola (i dati non cambiano) e
+    cancellato quando la sessione non esiste più.
+    """
+
+    def __init__(self, accountant, session_id, table, df):
+        self._accountant = accountant
+        self.session_id = session_id
+        self.table = table
+        self.nbytes = frame_bytes(df)
+        self.last_access = time.monotonic()
+        self._df = df
+        self._path = None
+        self._lock = threading.Lock()
+
+    @property
+    def spilled(self):
+        return self._df is None
+
+    def get(self):
+        with self._lock:
+            self.last_access = time.monotonic()
+            if self._df is None:
+                self._df = _load(self._path)
+                self.nbytes = frame_bytes(self._df)
+            df = self._df
+        self._accountant.enforce(keep=self)
+        return df
+
+    def spill(self):
+        """Libera la RAM; ritorna i byte liberati"""
+        with self._lock:
+            if self._df is None: return 0
+            if self._path is None:
+                self._path = _dump(self._df)
+                weakref.finalize(self, _remove, self._path)
+            self._df = None
+            return self.nbytes
+
+
+def resolve(source):
+    """DataFrame di una sorgente del workspace: un SessionDataset scaricato si ricarica solo qui"""
+    return source.get() if isinstance(source, SessionDataset) else source
+
+
+class MemoryAccountant:
+    """Contabilità dei DataFrame di tutte le sessioni del processo.
+
+    Quando la RAM usata supera il budget, i dataset inattivi da più tempo
+    vengono scaricati su disco (mai quello appena richiesto). I dataset sono
+    tenuti con riferimenti deboli: quando una sessione scade escono da soli.
+    """
+
+    def __init__(self, budget_mb=BUDGET_MB, idle_seconds=IDLE_SECONDS):
+        self.budget = int(budget_mb * 1024 * 1024)
+        self.idle_seconds = idle_seconds
+        self._datasets = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def register(self, session_id, table, df):
+        dataset = SessionDataset(self, session_id, table, df)
+        with self._lock: self._datasets.add(dataset)
+        self.enforce(keep=dataset)
+        return dataset
+
+    def _items(self):
+        with self._lock: return list(self._datasets)
+
+    @property
+    def total_size(self):
+        return sum(d.nbytes for d in self._items() if not d.spilled)
+
+    def enforce(self, keep=None):
+        items = self._items()
+        total = sum(d.nbytes for d in items if not d.spilled)
+        if total <= self.budget: return total
+        now = time.monotonic()
+        for d in sorted(items, key=lambda d: d.last_access):
+            if total <= self.budget: break
+            if d is keep or d.spilled or not d.nbytes or now - d.last_access < self.idle_seconds: continue
+            total -= d.spill()
+        return total
+
+    def snapshot(self):
+        """Impronta per sessione: tabelle, MB in RAM, MB scaricati, secondi di inattività"""
+        now = time.monotonic()
+        sessions = {}
+        for d in self._items():
+            s = sessions.setdefault(d.session_id, {"sessione": d.session_id, "tabelle": 0, "ram_mb": 0.0, "disco_mb": 0.0, "inattiva_s": None})
+            s["tabelle"] += 1
+            s["disco_mb" if d.spilled else "ram_mb"] += d.nbytes / 1024 / 1024
+            idle = now - d.last_access
+            s["inattiva_s"] = idle if s["inattiva_s"] is None else min(s["inattiva_s"], idle)
+        rows = sorted(sessions.values(), key=lambda s: -s["ram_mb"])
+        for s in rows:
+            s["ram_mb"] = round(s["ram_mb"], 1); s["disco_mb"] = round(s["disco_mb"], 1); s["inattiva_s"] = int(s["inattiva_s"])
+        return rows
@@ -0,0 +1,131 @@
+import os
+import json
+import time
+import threading
+from functools import wraps
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Endpoint locale opzionale: attivo solo se DATAGYM_METRICS_PORT è impostata
+METRICS_HOST = os.getenv("DATAGYM_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = os.getenv("DATAGYM_METRICS_PORT")
+DEBUG_PANEL = os.getenv("DATAGYM_DEBUG_PANEL", "0") == "1"
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+_series = {}  # (span, tag ordinati) -> [count, somma, max, conteggi per bucket]
+_local = threading.local()
+
+
+def _record(name, seconds, tags):
+    key = (name, tuple(sorted(tags.items())))
+    with _lock:
+        s = _series.get(key)
+        if s is None: s = _series[key] = [0, 0.0, 0.0, [0] * len(BUCKETS)]
+        s[0] += 1; s[1] += seconds; s[2] = max(s[2], seconds)
+        for i, b in enumerate(BUCKETS):
+            if seconds <= b: s[3][i] += 1; break
+
+
+def begin_rerun(**tags):
+    """Apre la raccolta degli span del rerun corrente (thread dello script)"""
+    _local.spans = []
+    _local.tags = {k: str(v) for k, v in tags.items()}
+    _local.start = time.perf_counter()
+
+
+def in_rerun():
+    """True se sul thread corrente c'è un rerun aperto (begin_rerun senza end_rerun)"""
+    return hasattr(_local, "start")
+
+
+def end_rerun():
+    """Chiude il rerun registrando la durata totale; ritorna gli span raccolti"""
+    if not hasattr(_local, "start"): return []
+    seconds = time.perf_counter() - _local.start
+    _record("rerun", seconds, _local.tags)
+    spans = _local.spans + [("rerun", seconds, _local.tags)]
+    del _local.start
+    return spans
+
+
+@contextmanager
+def span(name, **tags):
+    """Misura un blocco; i tag del rerun (pagina, traccia) vengono aggiunti in automatico"""
+    all_tags = {**getattr(_local, "tags", {}), **{k: str(v) for k, v in tags.items()}}
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        _record(name, seconds, all_tags)
+        spans = getattr(_local, "spans", None)
+        if spans is not None: spans.append((name, seconds, all_tags))
+
+
+def timed(name):
+    """Decoratore: come span() attorno a tutta la funzione"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name): return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def snapshot():
+    with _lock:
+        return [
+            {"span": name, "tags": dict(tags), "count": s[0], "sum_seconds": round(s[1], 6), "max_seconds": round(s[2], 6),
+             "buckets": {str(b): c for b, c in zip(BUCKETS, s[3])}}
+            for (name, tags), s in sorted(_series.items())
+        ]
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs):
+    return ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+
+
+def prometheus_text():
+    lines = ["# HELP datagym_span_duration_seconds Durata delle fasi di un rerun DataGym.",
+             "# TYPE datagym_span_duration_seconds histogram"]
+    for item in snapshot():
+        base = [("span", item["span"])] + sorted(item["tags"].items())
+        cumulative = 0
+        for b, c in item["buckets"].items():
+            cumulative += c
+            lines.append(f"datagym_span_duration_seconds_bucket{{{_labels(base + [('le', b)])}}} {cumulative}")
+        lines.append(f"datagym_span_duration_seconds_bucket{{{_labels(base + [('le', '+Inf')])}}} {item['count']}")
+        lines.append(f"datagym_span_duration_seconds_sum{{{_labels(base)}}} {item['sum_seconds']}")
+        lines.append(f"datagym_span_duration_seconds_count{{{_labels(base)}}} {item['count']}")
+    return "\n".join(lines) + "\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, ctype = prometheus_text().encode(), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body, ctype = json.dumps(snapshot()).encode(), "application/json"
+        else:
+            self.send_error(404); return
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args): pass
+
+
+def start_server(port=METRICS_PORT, host=METRICS_HOST):
+    """Avvia l'endpoint /metrics (Prometheus) e /metrics.json in un thread daemon"""
+    if not port: return None
+    server = ThreadingHTTPServer((host, int(port)), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,88 @@
+import os
+import re
+import json
+from modules import index_advisor
+
+# Funzioni mostrate nel profilo Python (cProfile, per tempo cumulativo)
+TOP_N = int(os.getenv("DATAGYM_PROFILE_TOP", "15"))
+# Profili tenuti per sessione, per confrontare versioni diverse della soluzione
+HISTORY = int(os.getenv("DATAGYM_PROFILE_HISTORY", "10"))
+
+_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)')
+# Righe di cProfile che misurano il profiler stesso
+_HIDDEN = {"<built-in method builtins.exec>", "<method 'disable' of '_lsprof.Profiler' objects>"}
+
+
+def sqlite_plan(conn, query):
+    """Albero di EXPLAIN QUERY PLAN come righe indentate (vuoto se la query non si prepara)"""
+    try: rows = conn.execute("EXPLAIN QUERY PLAN " + query).fetchall()
+    except Exception: return []
+    depth, lines = {0: -1}, []
+    for node, parent, _, detail in rows:
+        depth[node] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node] + detail)
+    return lines
+
+
+def sqlite_scanned(conn, query, plan):
+    """Stima delle righe lette: somma delle tabelle che il piano scandisce per intero.
+
+    SQLite non espone i contatori per operatore; le ricerche su indice
+    (SEARCH) leggono poche righe e non vengono contate.
+    """
+    names, total = index_advisor.aliases(query), 0
+    for line in plan:
+        m = _SCAN.match(line.strip())
+        if not m: continue
+        table = names.get(m.group(1), m.group(1))
+        schema = index_advisor.schema_of(conn, table)
+        if schema: total += index_advisor.table_rows(conn, schema, table)
+    return total
+
+
+def duckdb_plan(info):
+    """Operatori del profilo DuckDB con righe prodotte e tempo di ciascuno"""
+    lines = []
+
+    def walk(node, depth):
+        name = node.get("operator_name") or node.get("operator_type")
+        if name:
+            lines.append(f"{'  ' * depth}{name.strip()} · {node.get('operator_cardinality', 0):,} righe · {node.get('operator_timing', 0) * 1000:.1f} ms")
+            depth += 1
+        for child in node.get("children", []): walk(child, depth)
+
+    walk(info, 0)
+    return lines
+
+
+def duckdb_stats(conn, query, complete, stats):
+    """Piano e righe lette dell'ultima query (profiling già attivo sulla connessione)"""
+    try:
+        if complete:
+            info = json.loads(conn.get_profiling_information(format="json"))
+            stats['rows_scanned'] = info.get("cumulative_rows_scanned")
+            stats['plan'] = duckdb_plan(info)
+        else:
+            # Risultato troncato: la query non è arrivata in fondo, si mostra il piano stimato
+            stats['plan'] = "\n".join(row[1] for row in conn.execute("EXPLAIN " + query).fetchall()).splitlines()
+    except Exception: stats.setdefault('plan', [])  # versioni di DuckDB senza profiling JSON
+
+
+def top_functions(prof, n=TOP_N):
+    """Funzioni di un cProfile.Profile ordinate per tempo cumulativo"""
+    import pstats
+    rows = []
+    for (file, line, func), (_, calls, own, cumulative, _) in pstats.Stats(prof).stats.items():
+        name = func if file == "~" else f"{os.path.basename(file)}:{line}({func})"
+        if name in _HIDDEN: continue
+        rows.append({"funzione": name, "chiamate": calls, "tempo_ms": round(own * 1000, 2), "cumulativo_ms": round(cumulative * 1000, 2)})
+    rows.sort(key=lambda r: -r["cumulativo_ms"])
+    return rows[:n]
+
+
+def remember(history, profile):
+    """Aggiunge un profilo (numerato) alla cronologia della sessione; i più vecchi escono"""
+    profile['n'] = history[-1]['n'] + 1 if history else 1
+    history.append(profile)
+    del history[:-HISTORY]
+    return profile
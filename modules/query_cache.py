@@ -0,0 +1,165 @@
+import os
+import sqlite3
+import hashlib
+import threading
+import pandas as pd
+from collections import OrderedDict
+from contextlib import contextmanager
+from modules.memory import resolve
+
+
+def fingerprint_bytes(data):
+    """Impronta del contenuto di un file caricato (stessi byte = stessa chiave)"""
+    return hashlib.sha256(data).hexdigest()[:32]
+
+
+def workspace_fingerprint(table_fingerprints):
+    """Impronta di un workspace: nomi delle tabelle e contenuto di ciascuna"""
+    if not table_fingerprints: return None
+    return fingerprint_bytes("|".join(f"{t}:{fp}" for t, fp in sorted(table_fingerprints.items())).encode())
+
+
+class _Entry:
+    def __init__(self, conn, size):
+        self.conn = conn
+        self.size = size
+        self.lock = threading.Lock()
+        self.applied = set()  # istruzioni di setup (indici) già eseguite
+
+
+class DatasetCache:
+    """Cache LRU di database SQLite in memoria, uno per workspace.
+
+    Un workspace è l'insieme delle tabelle caricate da una sessione
+    ({nome tabella: DataFrame o path dello store}); la chiave è la sua
+    impronta (workspace_fingerprint), quindi il database viene caricato una
+    sola volta e riusato da tutti i rerun e da tutte le sessioni con le stesse
+    tabelle. Oltre il budget di memoria si scartano i database usati meno di
+    recente.
+    """
+
+    def __init__(self, budget_mb=None):
+        if budget_mb is None:
+            budget_mb = float(os.getenv("DATAGYM_QUERY_CACHE_MB", "256"))
+        self.budget = int(budget_mb * 1024 * 1024)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def total_size(self):
+        with self._lock:
+            return sum(e.size for e in self._entries.values())
+
+    def _load(self, tables):
+        conn = sqlite3.connect(":memory:", check_same_thread=False, isolation_level=None)
+        for table_name, source in tables.items():
+            # Store su disco (import a blocchi): collegato con ATTACH, in RAM resta
+            # solo la page cache; le query lo vedono con il nome della tabella
+            if isinstance(source, str): conn.execute("ATTACH DATABASE ? AS ?", (source, f"store_{table_name}"))
+            else: _sqlite_frame(resolve(source)).to_sql(table_name, conn, index=False, if_exists="replace")
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        return _Entry(conn, page_count * page_size)
+
+    def _get_or_load(self, fingerprint, tables):
+        key = fingerprint
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+        # Il caricamento avviene fuori dal lock globale: non blocca le altre sessioni
+        entry = self._load(tables)
+        with self._lock:
+            entry = self._entries.setdefault(key, entry)
+            self._entries.move_to_end(key)
+            self._evict()
+        return entry
+
+    def _evict(self):
+        total = sum(e.size for e in self._entries.values())
+        # L'ultimo inserito resta sempre, anche se da solo supera il budget
+        while total > self.budget and len(self._entries) > 1:
+            _, old = self._entries.popitem(last=False)
+            total -= old.size
+            # Nessun close esplicito: una query in corso potrebbe ancora usarla,
+            # la connessione si chiude quando non è più referenziata.
+
+    def invalidate(self, fingerprint):
+        """Rimuove dalla cache il database di un workspace"""
+        if not fingerprint: return
+        with self._lock:
+            self._entries.pop(fingerprint, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @contextmanager
+    def connection(self, fingerprint, tables, setup=()):
+        """Connessione al database del workspace, riservata al chiamante.
+
+        `tables` è {nome tabella: DataFrame (anche SessionDataset) o path di uno store SQLite su disco};
+        i DataFrame si leggono solo se il database va caricato.
+        `setup` sono istruzioni (es. CREATE INDEX IF NOT EXISTS) eseguite una
+        volta sola per database, anche se ricaricato dopo uno scarto LRU.
+
+        Le query girano dentro una transazione annullata alla fine, così un
+        DELETE o un DROP dello studente non altera i dati condivisi (come
+        succedeva con il database usa-e-getta ricreato a ogni RUN).
+        """
+        entry = self._get_or_load(fingerprint, tables)
+        with entry.lock:
+            conn = entry.conn
+            _apply_setup(entry, setup)
+            conn.execute("BEGIN")
+            conn.set_authorizer(_deny_transactions)
+            try:
+                yield conn
+            finally:
+                conn.set_authorizer(None)
+                if conn.in_transaction: conn.execute("ROLLBACK")
+
+    @contextmanager
+    def writable(self, fingerprint, tables, setup=()):
+        """Connessione fuori dalla transazione di protezione: le modifiche restano.
+
+        Solo per operazioni dell'app (indici), mai per il codice degli studenti.
+        """
+        entry = self._get_or_load(fingerprint, tables)
+        with entry.lock:
+            _apply_setup(entry, setup)
+            yield entry.conn
+
+
+def _apply_setup(entry, setup):
+    for sql in setup:
+        if sql in entry.applied: continue
+        try: entry.conn.execute(sql)
+        except sqlite3.Error: pass  # tabella non più nel workspace o store bloccato
+        entry.applied.add(sql)
+
+
+def date_columns(df):
+    """Colonne datetime con sole date (a mezzanotte), come quelle compattate all'upload"""
+    out = []
+    for col, dtype in df.dtypes.items():
+        if not pd.api.types.is_datetime64_any_dtype(dtype): continue
+        values = df[col].dropna()
+        if (values == values.dt.normalize()).all(): out.append(col)
+    return out
+
+
+def _sqlite_frame(df):
+    # Le date compattate all'upload tornano testo AAAA-MM-GG come nel file
+    # originale, così WHERE data = '2024-01-01' continua a funzionare
+    columns = date_columns(df)
+    if not columns: return df
+    out = df.copy(deep=False)
+    for col in columns: out[col] = df[col].dt.strftime("%Y-%m-%d")
+    return out
+
+
+def _deny_transactions(action, *args):
+    # Lo studente non può fare COMMIT della transazione di protezione
+    return sqlite3.SQLITE_DENY if action == sqlite3.SQLITE_TRANSACTION else sqlite3.SQLITE_OK
@@ -0,0 +1,181 @@
+import os
+import io
+import sys
+import time
+import types
+import queue
+import threading
+import contextlib
+import multiprocessing as mp
+
+POOL_SIZE = int(os.getenv("DATAGYM_PY_WORKERS", "2"))
+TIMEOUT_SECONDS = float(os.getenv("DATAGYM_PY_TIMEOUT", "10"))
+MEMORY_MB = int(os.getenv("DATAGYM_PY_MEMORY_MB", "512"))
+MAX_OUTPUT_BYTES = int(os.getenv("DATAGYM_PY_MAX_OUTPUT_KB", "256")) * 1024
+MAX_JOBS_PER_WORKER = int(os.getenv("DATAGYM_PY_MAX_JOBS", "50"))
+
+# Librerie già importate nei worker: il codice dello studente non paga l'import
+PRELOAD = ["pandas", "numpy"]
+
+
+class OutputLimitExceeded(Exception):
+    pass
+
+
+class _CappedOutput(io.StringIO):
+    def __init__(self, limit):
+        super().__init__()
+        self.limit = limit
+
+    def write(self, s):
+        if self.tell() + len(s) > self.limit:
+            raise OutputLimitExceeded(f"Output troppo lungo (massimo {self.limit // 1024} KB)")
+        return super().write(s)
+
+
+def _address_space():
+    try:
+        with open("/proc/self/statm") as f: return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError): return 0
+
+
+def _limit_memory(memory_mb):
+    # Il limite si aggiunge allo spazio già occupato da interprete e librerie precaricate
+    try:
+        import resource
+        limit = _address_space() + memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError): pass
+
+
+def _profiled_exec(code, profile):
+    # Tempo, picco di memoria (tracemalloc) e funzioni più costose (cProfile)
+    import cProfile, tracemalloc
+    from modules import profiler
+    compiled = compile(code, "<codice>", "exec")
+    prof = cProfile.Profile()
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        prof.enable()
+        try: exec(compiled, {}, {})
+        finally: prof.disable()
+    finally:
+        profile['ms'] = (time.perf_counter() - start) * 1000
+        profile['peak_kb'] = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+        # Senza la cattura dell'output (_CappedOutput), che non è codice dello studente
+        profile['functions'] = [f for f in profiler.top_functions(prof, n=profiler.TOP_N + 2) if "_CappedOutput" not in f['funzione']
+                                and not f['funzione'].startswith("sandbox.py:")][:profiler.TOP_N]
+
+
+def _worker_main(conn, memory_mb, max_output):
+    for name in PRELOAD:
+        try: __import__(name)
+        except ImportError: pass
+    _limit_memory(memory_mb)
+    while True:
+        try: code, profiled = conn.recv()
+        except (EOFError, OSError): return
+        out = _CappedOutput(max_output)
+        profile = {} if profiled else None
+        try:
+            with contextlib.redirect_stdout(out):
+                if profile is None: exec(code, {}, {})
+                else: _profiled_exec(code, profile)
+            result = (out.getvalue(), None)
+        except SystemExit: result = (out.getvalue(), None)
+        except MemoryError: result = (None, f"Memoria esaurita (limite {memory_mb} MB)")
+        except BaseException as e: result = (None, str(e))
+        conn.send(result + (profile,))
+
+
+_main_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def _without_main():
+    # Streamlit esegue app.py come __main__: con spawn/forkserver ogni worker
+    # lo reimporterebbe (ed eseguirebbe tutta l'app) prima di partire
+    with _main_lock:
+        main = sys.modules.get("__main__")
+        sys.modules["__main__"] = types.ModuleType("__main__")
+        try: yield
+        finally: sys.modules["__main__"] = main
+
+
+class _Worker:
+    def __init__(self, ctx):
+        self.conn, child_conn = ctx.Pipe()
+        self.proc = ctx.Process(target=_worker_main, args=(child_conn, MEMORY_MB, MAX_OUTPUT_BYTES), daemon=True)
+        with _without_main(): self.proc.start()
+        child_conn.close()
+        self.jobs = 0
+
+    def kill(self):
+        self.proc.kill(); self.proc.join(1)
+        self.conn.close()
+
+
+class PythonPool:
+    """Pool di processi worker per eseguire il codice Python degli studenti.
+
+    Ogni job ha un timeout, un limite di memoria (RLIMIT_AS) e un limite
+    sull'output; un worker scaduto o crashato viene sostituito, così un
+    `while True` non blocca il server Streamlit.
+    """
+
+    def __init__(self, size=POOL_SIZE, timeout=TIMEOUT_SECONDS):
+        if "forkserver" in mp.get_all_start_methods():
+            self._ctx = mp.get_context("forkserver")
+            self._ctx.set_forkserver_preload(PRELOAD)
+        else: self._ctx = mp.get_context("spawn")
+        self.timeout = timeout
+        self._idle = queue.Queue()
+        self._spawn_lock = threading.Lock()
+        for _ in range(size): self._idle.put(self._spawn())
+
+    def _spawn(self):
+        with self._spawn_lock: return _Worker(self._ctx)
+
+    def _recycle(self, worker):
+        worker.kill()
+        return self._spawn()
+
+    def run(self, code, timeout=None, cancel=None, stats=None):
+        """Esegue `code` in un worker; ritorna (stdout, errore) come exec in-process.
+
+        Se `cancel` (threading.Event) viene impostato, il worker è terminato e sostituito.
+        Se `stats` è un dict il codice gira sotto profiler e vi si scrivono
+        tempo (ms), picco di memoria (peak_kb) e funzioni più costose.
+        """
+        timeout = timeout or self.timeout
+        # In coda per un worker libero: l'attesa non conta nel timeout, ma si può annullare
+        while True:
+            if cancel is not None and cancel.is_set(): return None, "Esecuzione annullata."
+            try: worker = self._idle.get(timeout=0.1)
+            except queue.Empty: continue
+            break
+        deadline = time.monotonic() + timeout
+        try:
+            if not worker.proc.is_alive(): worker = self._recycle(worker)
+            try:
+                worker.conn.send((code, stats is not None))
+                while not worker.conn.poll(0.1):
+                    if cancel is not None and cancel.is_set():
+                        worker = self._recycle(worker)
+                        return None, "Esecuzione annullata."
+                    if time.monotonic() > deadline:
+                        worker = self._recycle(worker)
+                        return None, f"Tempo scaduto: esecuzione interrotta dopo {timeout:g} secondi"
+                *result, profile = worker.conn.recv()
+            except (EOFError, OSError):
+                worker = self._recycle(worker)
+                return None, "Esecuzione interrotta: il processo è terminato (memoria esaurita o crash)"
+            worker.jobs += 1
+            # Il codice può alterare i moduli precaricati: ogni tanto si riparte puliti
+            if worker.jobs >= MAX_JOBS_PER_WORKER: worker = self._recycle(worker)
+            if stats is not None and profile: stats.update(profile)
+            return tuple(result)
+        finally:
+            self._idle.put(worker)
@@ -0,0 +1,55 @@
+import os
+import time
+import sqlite3
+import pandas as pd
+
+TIMEOUT_SECONDS = float(os.getenv("DATAGYM_SQL_TIMEOUT", "10"))
+ROW_CAP = int(os.getenv("DATAGYM_SQL_ROW_CAP", "1000"))
+# Istruzioni della VM SQLite tra due controlli di timeout/annullamento
+PROGRESS_STEPS = 10000
+
+
+class QueryError(Exception):
+    pass
+
+
+class QueryInterrupted(QueryError):
+    pass
+
+
+def run_capped(conn, query, row_cap=ROW_CAP, timeout=TIMEOUT_SECONDS, cancel=None, stats=None):
+    """Esegue la query con un budget di tempo e legge al massimo row_cap righe.
+
+    Le righe arrivano dal cursore un blocco alla volta: una cross join
+    accidentale non viene mai materializzata per intero. Il DataFrame
+    restituito ha attrs['truncated'] = True se c'erano altre righe.
+    Se `stats` è un dict vi si contano le istruzioni eseguite dalla VM.
+    """
+    deadline = time.monotonic() + timeout
+    reason = []
+    if stats is not None: stats['vm_steps'] = 0
+
+    def check():
+        if stats is not None: stats['vm_steps'] += PROGRESS_STEPS
+        if cancel is not None and cancel.is_set(): reason.append("cancel"); return 1
+        if time.monotonic() > deadline: reason.append("timeout"); return 1
+        return 0
+
+    conn.set_progress_handler(check, PROGRESS_STEPS)
+    try:
+        cur = conn.execute(query)
+        if cur.description is None:
+            df, truncated = pd.DataFrame(), False
+        else:
+            rows = cur.fetchmany(row_cap + 1)
+            truncated = len(rows) > row_cap
+            df = pd.DataFrame.from_records(rows[:row_cap], columns=[d[0] for d in cur.description], coerce_float=True)
+        cur.close()
+    except sqlite3.OperationalError:
+        if "cancel" in reason: raise QueryInterrupted("Query annullata.")
+        if "timeout" in reason: raise QueryInterrupted(f"Query interrotta: superato il limite di {timeout:g} secondi.")
+        raise
+    finally:
+        conn.set_progress_handler(None, 0)
+    df.attrs['truncated'] = truncated
+    return df
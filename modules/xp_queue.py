@@ -0,0 +1,95 @@
+import os
+import time
+import atexit
+import threading
+
+FLUSH_SECONDS = float(os.getenv("DATAGYM_XP_FLUSH_SECONDS", "5"))
+MAX_BACKOFF_SECONDS = 300
+
+
+class XPWriter:
+    """Coda write-behind per XP e task completati.
+
+    I contatori in sessione si aggiornano subito; su Supabase finisce un solo
+    update per utente a ogni flush, con gli ultimi valori ricevuti. Se la
+    scrittura fallisce si ritenta con backoff esponenziale.
+    on_write(user_id, valori) viene chiamata dopo ogni scrittura riuscita.
+    Ogni utente scrive con il client della propria sessione (il suo JWT, per
+    le policy RLS); get_client serve solo se submit non ne riceve uno.
+    """
+
+    def __init__(self, get_client, interval=FLUSH_SECONDS, on_write=None):
+        # get_client: funzione che ritorna il client Supabase (creato in modo pigro)
+        self.get_client = get_client
+        self.interval = interval
+        self.on_write = on_write
+        self._pending = {}  # user_id -> [valori, tentativi falliti, prossimo tentativo, client]
+        self._user_locks = {}  # user_id -> Lock: una sola scrittura per utente alla volta
+        self._cond = threading.Condition()
+        self._thread = None
+        atexit.register(self.flush)
+
+    def submit(self, user_id, values, client=None):
+        """Accoda gli ultimi valori assoluti dell'utente (i precedenti vengono sostituiti)"""
+        with self._cond:
+            item = self._pending.get(user_id)
+            if item: item[0].update(values); item[3] = client or item[3]
+            else: self._pending[user_id] = [dict(values), 0, time.time() + self.interval, client]
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def pending(self, user_id):
+        """True se l'utente ha valori non ancora scritti"""
+        with self._cond:
+            return user_id in self._pending
+
+    def discard(self, user_id):
+        """Scarta i valori in coda dell'utente (logout senza salvare)"""
+        with self._cond:
+            self._pending.pop(user_id, None)
+
+    def _write(self, user_id, values, client=None):
+        res = (client or self.get_client()).table("utenti_app").update(values).eq("auth_user_id", user_id).execute()
+        # Con le policy RLS un client senza JWT dell'utente aggiorna 0 righe senza errori
+        if not res.data: raise RuntimeError("Nessuna riga aggiornata.")
+
+    def _flush_one(self, user_id):
+        with self._cond: user_lock = self._user_locks.setdefault(user_id, threading.Lock())
+        # Il lock resta preso fino alla fine della scrittura: flush() dell'utente e thread
+        # in background non possono scrivere valori vecchi dopo quelli nuovi
+        with user_lock:
+            with self._cond:
+                item = self._pending.pop(user_id, None)
+            if item is None: return True
+            values, attempts, _, client = item
+            try:
+                self._write(user_id, values, client)
+            except Exception:
+                with self._cond:
+                    # Rimette in coda, unendo i valori arrivati nel frattempo (più recenti)
+                    newer = self._pending.get(user_id)
+                    if newer: values = {**values, **newer[0]}; attempts = max(attempts, newer[1]); client = newer[3] or client
+                    delay = min(self.interval * 2 ** attempts, MAX_BACKOFF_SECONDS)
+                    self._pending[user_id] = [values, attempts + 1, time.time() + delay, client]
+                return False
+        if self.on_write:
+            try: self.on_write(user_id, values)
+            except Exception: pass  # un listener non deve far ritentare una scrittura riuscita
+        return True
+
+    def flush(self, user_id=None):
+        """Scrive subito i valori in coda (di un utente, o di tutti); True se tutto è andato a buon fine"""
+        if not self.get_client(): return False
+        with self._cond:
+            ids = [user_id] if user_id is not None else list(self._pending)
+        return all([self._flush_one(uid) for uid in ids])
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait(self.interval)
+                now = time.time()
+                due = [uid for uid, item in self._pending.items() if item[2] <= now]
+            if due and self.get_client():
+                for uid in due: self._flush_one(uid)
@@ -0,0 +1,19 @@
+-- Classifica: XP per traccia, indici per il top-N e vista senza dati personali
+
+alter table utenti_app add column if not exists xp_sql integer not null default 0;
+alter table utenti_app add column if not exists xp_python integer not null default 0;
+
+-- ORDER BY ... DESC LIMIT N letto dall'indice, senza scansione della tabella
+create index if not exists utenti_app_xp_idx on utenti_app (xp desc);
+create index if not exists utenti_app_xp_sql_idx on utenti_app (xp_sql desc);
+create index if not exists utenti_app_xp_python_idx on utenti_app (xp_python desc);
+
+-- La vista gira con i diritti del proprietario (salta le policy RLS di utenti_app),
+-- quindi espone solo quello che la classifica mostra a tutti: niente email né
+-- auth_user_id. chiave_utente (md5 dell'id) serve all'app per riconoscere l'utente.
+drop view if exists classifica;
+create view classifica as
+    select md5(auth_user_id::text) as chiave_utente, username, xp, xp_sql, xp_python
+    from utenti_app;
+
+grant select on classifica to anon, authenticated;